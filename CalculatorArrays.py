@@ -0,0 +1,119 @@
+"""Vectorised evaluation of expressions over NumPy arrays for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorParser import ExpressionSyntaxError
+import math
+import numpy as np
+
+_factorial_table = None
+
+def _factorial(values: np.ndarray) -> np.ndarray:
+    """Element-wise factorial using a lookup table. Elements that are not whole numbers from 0 to
+    FLOAT_FACTORIAL_LIMIT become NaN."""
+    global _factorial_table
+    if _factorial_table is None:
+        _factorial_table = np.array([math.factorial(n) for n in range(FLOAT_FACTORIAL_LIMIT + 1)],
+                                    dtype=np.float64)
+    whole = (values >= 0) & (values <= FLOAT_FACTORIAL_LIMIT) & (values == np.floor(values))
+    indices = np.where(whole, values, 0).astype(np.intp)
+    return np.where(whole, _factorial_table[indices], np.nan)
+
+class ArrayResult:
+    """The values of an expression evaluated over arrays and a mask of the elements that failed."""
+    def __init__(self, values: np.ndarray, errors: np.ndarray) -> None:
+        """Initialises a result. Failed elements of values are NaN."""
+        self.values = values
+        self.errors = errors
+
+    def to_display(self, format_result=None) -> list:
+        """Return a list with each value formatted for display and MATH_ERROR for each failed element."""
+        format_result = format_result or str
+        return [MATH_ERROR if error else format_result(float(value))
+                for value, error in zip(self.values.ravel(), self.errors.ravel())]
+
+    def __len__(self) -> int:
+        return self.values.size
+
+class ArrayExpression:
+    """A compiled expression that evaluates element-wise over NumPy arrays with vectorised ufuncs."""
+    def __init__(self, compiled, processor) -> None:
+        """Initialises an array expression from a CompiledExpression and the processor that compiled it."""
+        self.compiled = compiled
+        self._processor = processor
+        self._binary_operations = {PLUS: np.add, MINUS: np.subtract, MULTIPLY: np.multiply,
+                                   DIVIDE: np.true_divide, POWER: np.power}
+        self._unary_operations = {MINUS: np.negative, FACTORIAL: _factorial, ABSOLUTE_VALUE: np.abs,
+                                  SQUARE_ROOT: np.sqrt, LOG: np.log10, LN: np.log, SIN: self._sine,
+                                  COS: self._cosine, TAN: self._tangent}
+
+    def evaluate(self, **variables) -> ArrayResult:
+        """Evaluate the expression with variables bound to arrays or scalars and return an ArrayResult.
+        Ans and M default to the processor's current values."""
+        values = dict(self._processor._variables)
+        values.update(variables)
+        missing = sorted(self.compiled.variables.difference(values))
+        if missing:
+            raise ExpressionSyntaxError(f"Undefined variable {missing[0]}")
+
+        unary_operations = self._unary_operations
+        binary_operations = self._binary_operations
+        self.compiled._update()
+        stack = []
+        temporaries = {}
+        errors = np.False_
+        with np.errstate(all="ignore"):
+            for instruction, argument in self.compiled.program:
+                if instruction == PUSH_NUMBER or instruction == LOAD_VARIABLE:
+                    if instruction == LOAD_VARIABLE:
+                        argument = values[argument]
+                    stack.append(self._as_array(argument))
+                    continue
+                if instruction == STORE_TEMPORARY:
+                    temporaries[argument] = stack[-1]
+                    continue
+                if instruction == LOAD_TEMPORARY:
+                    stack.append(temporaries[argument])
+                    continue
+                if instruction == APPLY_BINARY:
+                    right = stack.pop()
+                    result = binary_operations[argument](stack[-1], right)
+                else:
+                    result = unary_operations[argument](stack[-1])
+                errors = errors | ~np.isfinite(result)
+                stack[-1] = result
+
+            result = stack[0]
+            errors = np.broadcast_to(errors | ~np.isfinite(result), np.shape(result))
+        return ArrayResult(np.where(errors, np.nan, result), errors)
+
+    __call__ = evaluate
+
+    def _as_array(self, value) -> np.ndarray:
+        """Convert a number or array to a float64 array. Ints too large for a float become infinity."""
+        try:
+            return np.asarray(value, dtype=np.float64)
+        except OverflowError:
+            return np.asarray(math.inf if value > 0 else -math.inf)
+
+    def _sine(self, angles: np.ndarray) -> np.ndarray:
+        """Element-wise sine in the processor's angle mode."""
+        if self._processor.angle_mode == DEGREES:
+            return np.round(np.sin(np.deg2rad(angles)), TRIGONOMETRY_DIGITS)
+        return np.sin(angles)
+
+    def _cosine(self, angles: np.ndarray) -> np.ndarray:
+        """Element-wise cosine in the processor's angle mode."""
+        if self._processor.angle_mode == DEGREES:
+            return np.round(np.cos(np.deg2rad(angles)), TRIGONOMETRY_DIGITS)
+        return np.cos(angles)
+
+    def _tangent(self, angles: np.ndarray) -> np.ndarray:
+        """Element-wise tangent in the processor's angle mode. Undefined degree tangents become infinite."""
+        if self._processor.angle_mode == DEGREES:
+            return self._sine(angles) / self._cosine(angles)
+        return np.tan(angles)
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
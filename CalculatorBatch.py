@@ -0,0 +1,146 @@
+"""Headless batch evaluation for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorModel import CalculationProcessor, EvaluationBudget
+from collections import deque
+import itertools
+import os
+import threading
+import time
+
+BATCH_WRITE_LINES = 1024
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+_worker_state = threading.local()
+
+def evaluate_stream(lines, output, processor: CalculationProcessor = None) -> int:
+    """Evaluate each line of an iterable of expressions and write one result per line to output as they
+    are produced. Lines are independent of each other, so Ans is not carried between them. Writes are
+    buffered BATCH_WRITE_LINES at a time and only that many results are held in memory. Returns the
+    number of lines evaluated."""
+    if processor is None:
+        processor = CalculationProcessor()
+    process_input = processor.process_input
+    pending = []
+    count = 0
+    for line in lines:
+        pending.append(process_input(line.strip(), remember_answer=False))
+        count += 1
+        if len(pending) == BATCH_WRITE_LINES:
+            pending.append(BLANK)
+            output.write("\n".join(pending))
+            pending.clear()
+
+    if pending:
+        pending.append(BLANK)
+        output.write("\n".join(pending))
+    output.flush()
+    return count
+
+def _initialise_worker(cache_size: int, persistent_cache=None, number_mode: str = FLOAT_MODE,
+                       decimal_precision: int = DECIMAL_PRECISION) -> None:
+    """Give the current worker process or thread its own processor."""
+    _worker_state.processor = CalculationProcessor(cache_size, persistent_cache=persistent_cache,
+                                                   number_mode=number_mode, decimal_precision=decimal_precision)
+
+def _evaluate_chunk(lines: list, deadline: float = None, steps: int = None) -> tuple:
+    """Evaluate a chunk of lines in a worker. Returns the results in order, the worker's name and the
+    seconds spent. An unexpected failure on one line is reported as MATH_ERROR for that line only. If
+    deadline, a time.monotonic() value, or steps is given, each line is evaluated with a budget ending at
+    the deadline and limited to steps instructions, and gives MATH_ERROR if it runs out."""
+    start = time.perf_counter()
+    process_input = _worker_state.processor.process_input
+    limited = deadline is not None or steps is not None
+    results = []
+    for line in lines:
+        try:
+            budget = None
+            if limited:
+                budget = EvaluationBudget(None if deadline is None else deadline - time.monotonic(), steps)
+            results.append(process_input(line.strip(), remember_answer=False, budget=budget))
+        except Exception:
+            results.append(MATH_ERROR)
+    worker = f"{os.getpid()}:{threading.current_thread().name}"
+    return results, worker, time.perf_counter() - start
+
+class ParallelBatchRunner:
+    """Evaluates lines of expressions on a pool of worker processes (or threads) in chunks, writing the
+    results in input order."""
+    def __init__(self, workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE, use_threads: bool = False,
+                 cache_size: int = 0, persistent_cache=None, number_mode: str = FLOAT_MODE,
+                 decimal_precision: int = DECIMAL_PRECISION) -> None:
+        """Initialises a runner. workers defaults to the number of CPUs and each worker memoizes up to
+        cache_size results. Workers share persistent_cache, a PersistentResultCache, if one is given, and
+        evaluate in number_mode."""
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.use_threads = use_threads
+        self.cache_size = cache_size
+        self.persistent_cache = persistent_cache
+        self.number_mode = number_mode
+        self.decimal_precision = decimal_precision
+        self._worker_stats = {}
+        self._elapsed = 0.0
+        self._count = 0
+
+    def run(self, lines, output) -> int:
+        """Evaluate an iterable of lines and write one result per line to output. At most
+        CHUNKS_IN_FLIGHT_PER_WORKER chunks per worker are queued at once, so memory use does not grow with
+        the input size. Returns the number of lines evaluated."""
+        import concurrent.futures
+
+        if self.use_threads:
+            executor_class = concurrent.futures.ThreadPoolExecutor
+        else:
+            executor_class = concurrent.futures.ProcessPoolExecutor
+        self._worker_stats = {}
+        self._count = 0
+        start = time.perf_counter()
+
+        max_in_flight = self.workers * CHUNKS_IN_FLIGHT_PER_WORKER
+        in_flight = deque()
+        lines = iter(lines)
+        with executor_class(self.workers, initializer=_initialise_worker,
+                            initargs=(self.cache_size, self.persistent_cache, self.number_mode,
+                                      self.decimal_precision)) as executor:
+            while True:
+                chunk = list(itertools.islice(lines, self.chunk_size))
+                if not chunk:
+                    break
+                in_flight.append(executor.submit(_evaluate_chunk, chunk))
+                if len(in_flight) >= max_in_flight:
+                    self._write_chunk(in_flight.popleft().result(), output)
+            while in_flight:
+                self._write_chunk(in_flight.popleft().result(), output)
+
+        output.flush()
+        self._elapsed = time.perf_counter() - start
+        return self._count
+
+    def stats(self) -> dict:
+        """Return the overall throughput of the last run and the throughput of each worker in
+        expressions per second of time spent evaluating."""
+        workers = {}
+        for worker, (expressions, seconds) in self._worker_stats.items():
+            workers[worker] = {"expressions": expressions, "seconds": seconds,
+                               "expressions_per_second": expressions / seconds if seconds else 0.0}
+        return {"expressions": self._count, "seconds": self._elapsed,
+                "expressions_per_second": self._count / self._elapsed if self._elapsed else 0.0,
+                "workers": workers}
+
+    def _write_chunk(self, chunk_result: tuple, output) -> None:
+        """Write the results of a finished chunk and record its worker's throughput."""
+        results, worker, seconds = chunk_result
+        results.append(BLANK)
+        output.write("\n".join(results))
+        expressions = len(results) - 1
+        self._count += expressions
+        previous_expressions, previous_seconds = self._worker_stats.get(worker, (0, 0.0))
+        self._worker_stats[worker] = (previous_expressions + expressions, previous_seconds + seconds)
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
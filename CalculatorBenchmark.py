@@ -0,0 +1,240 @@
+"""Performance measurements for ScientificCalculator.py. Run python CalculatorBenchmark.py --help for usage."""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorModel import *
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+STARTUP_RUNS = 15
+DEFAULT_THRESHOLD = 0.25
+SECONDS_PER_MEASUREMENT = 0.25
+WORKLOAD_SEED = 82
+HEADLESS_FORBIDDEN_MODULES = ("tkinter", "_tkinter", "numpy", "concurrent.futures")
+_APPLICATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ScientificCalculator.py")
+
+def _time_command(command: list, input_text: str) -> float:
+    """Run a command to completion and return its wall time in seconds."""
+    start = time.perf_counter()
+    subprocess.run(command, input=input_text, stdout=subprocess.DEVNULL, check=True, text=True)
+    return time.perf_counter() - start
+
+def headless_imports() -> set:
+    """Return the names of all modules imported by a headless batch run."""
+    command = [sys.executable, "-X", "importtime", _APPLICATION, "--batch"]
+    completed = subprocess.run(command, input="1+1\n", capture_output=True, check=True, text=True)
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+def measure_cold_start(runs: int = STARTUP_RUNS) -> dict:
+    """Measure the cold start time of a headless batch run evaluating a single expression. The overhead is
+    the median time beyond starting a bare interpreter, which is less noisy than the total."""
+    bare = [_time_command([sys.executable, "-c", "pass"], BLANK) for run in range(runs)]
+    headless = [_time_command([sys.executable, _APPLICATION, "--batch"], "1+1\n") for run in range(runs)]
+    forbidden = sorted(module for module in headless_imports() if module in HEADLESS_FORBIDDEN_MODULES)
+    return {"interpreter_seconds": statistics.median(bare),
+            "headless_seconds": statistics.median(headless),
+            "overhead_seconds": statistics.median(headless) - statistics.median(bare),
+            "forbidden_imports": forbidden}
+
+def _keypad_workload() -> list:
+    """Short expressions like those typed on the keypad. E.g. '12+7×3' or '(4.5-2)÷5'."""
+    generator = random.Random(WORKLOAD_SEED)
+    operators = (PLUS, MINUS, MULTIPLY, DIVIDE)
+    expressions = []
+    for count in range(200):
+        numbers = [str(generator.randint(1, 999)) for term in range(generator.randint(2, 4))]
+        expression = numbers[0]
+        for number in numbers[1:]:
+            expression += generator.choice(operators) + number
+        if generator.random() < 0.3:
+            expression = f"({expression}){generator.choice(operators)}{generator.randint(1, 9)}.5"
+        expressions.append(expression)
+    return expressions
+
+def _flat_sum_workload() -> list:
+    """Very long sums and differences without brackets."""
+    generator = random.Random(WORKLOAD_SEED)
+    terms = [str(generator.randint(1, 99999)) for term in range(5000)]
+    return [PLUS.join(terms), MINUS.join(terms)]
+
+def _nested_workload() -> list:
+    """Deeply nested brackets. E.g. '(1+(2×(3+...)))'."""
+    depth = 150
+    expression = "1"
+    for level in range(depth):
+        expression = f"({level % 9 + 1}{MULTIPLY if level % 2 else PLUS}{expression})"
+    return [expression]
+
+def _scientific_workload() -> list:
+    """Mixed scientific functions, powers, roots and factorials."""
+    generator = random.Random(WORKLOAD_SEED)
+    templates = ("sin({0})+cos({1})×tan({2})", "log({0})+ln({1})-√({2})", "{0}^2+{1}^3÷{2}!",
+                 "|{0}-{1}|×Abs({2}-{0})", "√(sin({0})^2+cos({1})^2)×10^{2}")
+    return [generator.choice(templates).format(*(generator.randint(1, 12) for argument in range(3)))
+            for count in range(200)]
+
+ENGINE_WORKLOADS = {"keypad": _keypad_workload, "flat_sum": _flat_sum_workload, "nested": _nested_workload,
+                    "scientific": _scientific_workload}
+
+def _engine_stages(processor: CalculationProcessor, expression: str) -> dict:
+    """Return a zero argument callable for each stage of evaluating an expression, with the inputs of
+    each stage prepared in advance. The evaluate and call stages run the unoptimised program, as folding
+    reduces constant workloads to a single number, and the optimised stages show what folding saves."""
+    tokens = tokenize(expression)
+    normalised_expression = BLANK.join([token.text for token in tokens])
+    tree = Parser(tokens, processor._make_number).parse()
+    compiled = CompiledExpression(expression, normalised_expression, tree, processor, optimise_tree=False)
+    optimised = CompiledExpression(expression, normalised_expression, tree, processor)
+    variables = processor._variables
+    return {"tokenize": lambda: tokenize(expression),
+            "parse": lambda: Parser(tokens, processor._make_number).parse(),
+            "compile": lambda: CompiledExpression(expression, normalised_expression, tree, processor),
+            "evaluate": lambda: compiled.evaluate(variables),
+            "call": compiled,
+            "evaluate_optimised": lambda: optimised.evaluate(variables),
+            "call_optimised": optimised,
+            "process_input": lambda: processor.process_input(expression, remember_answer=False)}
+
+def _measure(callables: list, seconds: float) -> dict:
+    """Call each callable in turn until seconds have passed and return throughput, latency percentiles
+    and the peak memory allocated by a single pass over the callables. Each callable is called once first,
+    so one-off work such as generating the code of a compiled expression is not timed."""
+    for function in callables:
+        function()
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or not latencies:
+        for function in callables:
+            start = perf_counter_ns()
+            function()
+            latencies.append(perf_counter_ns() - start)
+
+    tracemalloc.start()
+    for function in callables:
+        function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {"ops_per_second": len(latencies) / (sum(latencies) / 1e9),
+            "p50_microseconds": latencies[len(latencies) // 2] / 1000,
+            "p99_microseconds": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] / 1000,
+            "peak_memory_kib": peak_memory / 1024}
+
+def measure_engine(seconds: float = SECONDS_PER_MEASUREMENT, workloads: list = None,
+                   modes: list = None) -> dict:
+    """Measure every stage of the evaluation engine on each workload in each number mode. Results are keyed
+    by 'workload/stage', with '@mode' appended for modes other than FLOAT_MODE."""
+    results = {}
+    for mode in modes or (FLOAT_MODE,):
+        processor = CalculationProcessor(number_mode=mode)
+        suffix = BLANK if mode == FLOAT_MODE else f"@{mode}"
+        for workload in workloads or ENGINE_WORKLOADS:
+            stages = [_engine_stages(processor, expression) for expression in ENGINE_WORKLOADS[workload]()]
+            for stage in stages[0]:
+                results[f"{workload}/{stage}{suffix}"] = _measure([callables[stage] for callables in stages],
+                                                                  seconds)
+    return results
+
+def check_engine(results: dict, baseline: dict, threshold: float) -> list:
+    """Return a list of measurements whose throughput or peak memory regressed past threshold compared to
+    their baseline."""
+    problems = []
+    for name, measurement in results.items():
+        previous = (baseline or {}).get(name)
+        if previous is None:
+            continue
+        if measurement["ops_per_second"] < previous["ops_per_second"] * (1 - threshold):
+            problems.append(f"{name} throughput {measurement['ops_per_second']:.0f}/s is below "
+                            f"baseline {previous['ops_per_second']:.0f}/s")
+        if measurement["peak_memory_kib"] > previous["peak_memory_kib"] * (1 + threshold):
+            problems.append(f"{name} peak memory {measurement['peak_memory_kib']:.1f}KiB is above "
+                            f"baseline {previous['peak_memory_kib']:.1f}KiB")
+    return problems
+
+def load_baseline(path: str) -> dict:
+    """Load saved benchmark results, or return an empty dict if there are none yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+def save_baseline(path: str, name: str, results: dict) -> None:
+    """Save results under name in the baseline file, keeping results saved under other names."""
+    baseline = load_baseline(path)
+    baseline[name] = results
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+def check_cold_start(results: dict, baseline: dict, threshold: float) -> list:
+    """Return a list of problems with a cold start measurement compared to its baseline."""
+    problems = []
+    if results["forbidden_imports"]:
+        problems.append(f"headless run imported {', '.join(results['forbidden_imports'])}")
+    if baseline:
+        limit = baseline["overhead_seconds"] * (1 + threshold)
+        if results["overhead_seconds"] > limit:
+            problems.append(f"cold start overhead {results['overhead_seconds'] * 1000:.1f}ms exceeds "
+                            f"{limit * 1000:.1f}ms")
+    return problems
+
+def parse_arguments(arguments: list = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=f"{APP_TITLE} benchmarks")
+    parser.add_argument("suite", choices=("startup", "engine"), help="what to measure")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", metavar="FILE",
+                        help="file baselines are read from and saved to")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail if a result is slower than the baseline by more than this fraction")
+    parser.add_argument("--runs", type=int, default=STARTUP_RUNS, help="number of start up measurements")
+    parser.add_argument("--seconds", type=float, default=SECONDS_PER_MEASUREMENT,
+                        help="time spent on each engine measurement")
+    parser.add_argument("--workload", action="append", choices=tuple(ENGINE_WORKLOADS),
+                        help="only measure this engine workload (may be repeated)")
+    parser.add_argument("--mode", action="append", choices=NUMBER_MODES,
+                        help="measure the engine in this number mode (may be repeated, default float)")
+    return parser.parse_args(arguments)
+
+def main() -> int:
+    """Run the requested benchmarks and return a non-zero exit status if any regressed."""
+    arguments = parse_arguments()
+    baseline = load_baseline(arguments.baseline).get(arguments.suite)
+    if arguments.suite == "startup":
+        results = measure_cold_start(arguments.runs)
+        print(f"interpreter {results['interpreter_seconds'] * 1000:.1f}ms, "
+              f"headless {results['headless_seconds'] * 1000:.1f}ms, "
+              f"overhead {results['overhead_seconds'] * 1000:.1f}ms")
+        problems = check_cold_start(results, baseline, arguments.threshold)
+    else:
+        results = measure_engine(arguments.seconds, arguments.workload, arguments.mode)
+        print(f"{'measurement':<36}{'ops/s':>12}{'p50 us':>12}{'p99 us':>12}{'peak KiB':>12}")
+        for name, measurement in results.items():
+            print(f"{name:<36}{measurement['ops_per_second']:>12.0f}{measurement['p50_microseconds']:>12.1f}"
+                  f"{measurement['p99_microseconds']:>12.1f}{measurement['peak_memory_kib']:>12.1f}")
+        problems = check_engine(results, baseline, arguments.threshold)
+
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if arguments.save and not problems:
+        if baseline and arguments.suite == "engine":
+            baseline.update(results)
+            results = baseline
+        save_baseline(arguments.baseline, arguments.suite, results)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
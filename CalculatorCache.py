@@ -0,0 +1,227 @@
+"""Result caches for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from collections import OrderedDict
+import os
+import threading
+import time
+
+PERSISTENT_CACHE_BYTES = 256 * 1024 * 1024
+PERSISTENT_CACHE_MIN_SECONDS = 0.001
+PERSISTENT_CACHE_TIMEOUT = 30.0
+TOUCH_INTERVAL_SECONDS = 60.0
+EVICTION_BATCH = 256
+_KEY_SEPARATOR = "\x1f"
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,
+                                    last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS results_by_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results
+    BEGIN UPDATE totals SET size = size + new.size; END;
+CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results
+    BEGIN UPDATE totals SET size = size + new.size - old.size; END;
+CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results
+    BEGIN UPDATE totals SET size = size - old.size; END;
+"""
+
+def encode_number(value) -> str:
+    """Encode an int, float, Fraction or Decimal as text that decode_number turns back into an equal number
+    of the same type. Ints are written in hexadecimal, which is fast for ints of any size."""
+    if type(value) is int:
+        return f"i{value:x}"
+    if type(value) is float:
+        return f"f{value.hex()}"
+    type_name = type(value).__name__
+    if type_name == "Fraction":
+        return f"q{value.numerator:x}/{value.denominator:x}"
+    if type_name == "Decimal":
+        return f"d{value}"
+    raise TypeError(f"Can not encode {type(value).__name__}")
+
+def decode_number(text: str):
+    """Decode a number encoded by encode_number."""
+    kind, body = text[0], text[1:]
+    if kind == "i":
+        return int(body, 16)
+    if kind == "f":
+        return float.fromhex(body)
+    if kind == "q":
+        from fractions import Fraction
+        numerator, denominator = body.split("/")
+        return Fraction(int(numerator, 16), int(denominator, 16))
+    if kind == "d":
+        from decimal import Decimal
+        return Decimal(body)
+    raise ValueError(f"Unknown number encoding {text!r}")
+
+class ResultCache:
+    """A bounded mapping which evicts the least recently used entry once it is full."""
+    def __init__(self, max_size: int) -> None:
+        """Initialises an empty cache holding at most max_size entries."""
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the value stored for key, marking it as recently used, or default if it is not cached."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        """Store value for key, evicting the least recently used entry if the cache is full."""
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        entries[key] = value
+
+    def clear(self) -> None:
+        """Remove all entries. The hit, miss and eviction counters are kept."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return the hit, miss and eviction counters along with the current and maximum size."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self._entries), "max_size": self.max_size}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __iter__(self):
+        """Iterate over the cached keys from least to most recently used without marking them as used."""
+        return iter(list(self._entries))
+
+class PersistentResultCache:
+    """An on-disk result cache shared between runs, processes and machines with a common volume. Entries
+    are stored in sqlite in write-ahead log mode, so many readers can use it while one process writes.
+    Once the stored values exceed max_bytes the least recently used entries are removed. Only results
+    that took at least min_seconds to evaluate are worth storing."""
+    def __init__(self, path: str, max_bytes: int = PERSISTENT_CACHE_BYTES,
+                 min_seconds: float = PERSISTENT_CACHE_MIN_SECONDS) -> None:
+        """Initialises a cache stored at path, creating the file if needed. The connection is opened on
+        first use by each thread and process."""
+        self.path = path
+        self.max_bytes = max_bytes
+        self.min_seconds = min_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+        self._local = threading.local()
+
+    def get(self, key: tuple):
+        """Return the value stored for a processor cache key, or None if it is not stored. A store that can
+        not be read, e.g. because it is locked for too long, is treated as a miss."""
+        import sqlite3
+        key_text = self._key_text(key)
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, last_used FROM results WHERE key = ?", (key_text,)).fetchone()
+            if row is not None and time.time() - row[1] > TOUCH_INTERVAL_SECONDS:
+                # Only touch entries occasionally so hits rarely need to write.
+                with connection:
+                    connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key_text))
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_number(row[0])
+
+    def put(self, key: tuple, value) -> None:
+        """Store value for a processor cache key, evicting least recently used entries if over max_bytes.
+        Values are not stored if the store can not be written to."""
+        import sqlite3
+        encoded = encode_number(value)
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute("INSERT INTO results VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                                   "value = excluded.value, size = excluded.size, last_used = excluded.last_used",
+                                   (self._key_text(key), encoded, len(encoded), time.time()))
+                while connection.execute("SELECT size FROM totals").fetchone()[0] > self.max_bytes:
+                    removed = connection.execute("DELETE FROM results WHERE key IN (SELECT key FROM results "
+                                                 "ORDER BY last_used LIMIT ?)", (EVICTION_BATCH,)).rowcount
+                    if not removed:
+                        break
+                    self.evictions += removed
+        except sqlite3.Error:
+            self.errors += 1
+            return
+        self.writes += 1
+
+    def clear(self) -> None:
+        """Remove all stored entries."""
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM results")
+
+    def stats(self) -> dict:
+        """Return this process's hit, miss, write, eviction and error counters and the stored size in bytes."""
+        size = self._connection().execute("SELECT size FROM totals").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions,
+                "errors": self.errors, "bytes": size, "max_bytes": self.max_bytes}
+
+    def close(self) -> None:
+        """Close this thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def __getstate__(self) -> dict:
+        """Connections are not pickled, so a cache can be sent to worker processes."""
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return the sqlite connection for the current thread and process, opening it if needed."""
+        local = self._local
+        if getattr(local, "connection", None) is None or local.pid != os.getpid():
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=PERSISTENT_CACHE_TIMEOUT)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(_SCHEMA)
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def _key_text(self, key: tuple) -> str:
+        """Turn a processor cache key into text. Variable values are encoded with their type."""
+        parts = []
+        for part in key:
+            if type(part) is tuple:
+                name, value_type, value = part
+                part = f"{name}={BLANK if value is None else encode_number(value)}"
+            parts.append(part)
+        return _KEY_SEPARATOR.join(parts)
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
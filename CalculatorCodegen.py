@@ -0,0 +1,115 @@
+"""Generation of Python functions from expression trees for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorParser import Number, UnaryOperation, Variable
+import operator
+
+# Operations that can be written with Python operators instead of calls.
+_INFIX_OPERATORS = {operator.add: "+", operator.sub: "-", operator.mul: "*"}
+_PREFIX_OPERATORS = {operator.neg: "-"}
+
+class GeneratedFunction:
+    """A Python function generated from an expression tree. Call it with a dict of variable values and
+    a dict of fallback values, e.g. the processor's Ans and M. Raises KeyError for a missing variable."""
+    __slots__ = ("function", "source")
+
+    def __init__(self, function, source: str) -> None:
+        self.function = function
+        self.source = source
+
+def generate_function(tree, processor) -> GeneratedFunction:
+    """Generate a Python function evaluating tree, usually optimised by CalculatorOptimiser.optimise, with
+    the operations of processor. Every operation is assigned to its own local, so deeply nested trees do
+    not hit the limits of Python's compiler, and a node appearing several times in the tree is only
+    evaluated once. Raises SyntaxError, RecursionError or MemoryError if the source can not be compiled."""
+    binary_operations = processor._binary_operations
+    unary_operations = processor._unary_operations
+    state_names = processor._variables
+    constants = []
+    functions = []
+    function_names = {}
+    variables = {}
+    lines = []
+    emitted = {}
+
+    def reference(result: tuple) -> str:
+        # Constants only get a name once generated code uses them.
+        is_constant, value, name = result
+        if is_constant:
+            constants.append(value)
+            return f"_c{len(constants) - 1}"
+        return name
+
+    def function_name(function) -> str:
+        name = function_names.get(id(function))
+        if name is None:
+            functions.append(function)
+            name = function_names[id(function)] = f"_f{len(functions) - 1}"
+        return name
+
+    # Each node becomes (is constant, value, reference) once its operands are done.
+    results = []
+    pending = [(tree, False)]
+    while pending:
+        node, children_done = pending.pop()
+        node_type = type(node)
+        result = emitted.get(id(node))
+        if result is not None:
+            results.append(result)
+            continue
+        if node_type is Number:
+            results.append((True, node.value, None))
+            continue
+        if node_type is Variable:
+            name = node.name
+            local = variables.get(name)
+            if local is None:
+                local = variables[name] = f"_v{len(variables)}"
+                if name in state_names:
+                    lines.append(f"{local} = _arguments[{name!r}] if {name!r} in _arguments else _state[{name!r}]")
+                else:
+                    lines.append(f"{local} = _arguments[{name!r}]")
+            results.append((False, None, local))
+            continue
+        if not children_done:
+            pending.append((node, True))
+            if node_type is UnaryOperation:
+                pending.append((node.operand, False))
+            else:
+                pending.append((node.right, False))
+                pending.append((node.left, False))
+            continue
+
+        if node_type is UnaryOperation:
+            function = unary_operations[node.operator]
+            operands = [results.pop()]
+        else:
+            function = binary_operations[node.operator]
+            right = results.pop()
+            operands = [results.pop(), right]
+
+        references = [reference(operand) for operand in operands]
+        if len(references) == 2 and function in _INFIX_OPERATORS:
+            expression = f"{references[0]} {_INFIX_OPERATORS[function]} {references[1]}"
+        elif len(references) == 1 and function in _PREFIX_OPERATORS:
+            expression = f"{_PREFIX_OPERATORS[function]}{references[0]}"
+        else:
+            expression = f"{function_name(function)}({', '.join(references)})"
+        local = f"_t{len(lines)}"
+        lines.append(f"{local} = {expression}")
+        emitted[id(node)] = (False, None, local)
+        results.append((False, None, local))
+
+    result = reference(results[0])
+    closure = [f"_c{index}" for index in range(len(constants))] + [f"_f{index}" for index in range(len(functions))]
+    source = "\n".join([f"def _make({', '.join(closure)}):", "  def _expression(_arguments, _state):"]
+                       + ["    " + line for line in lines]
+                       + [f"    return {result}", "  return _expression"])
+    namespace = {}
+    exec(compile(source, "<expression>", "exec"), namespace)
+    return GeneratedFunction(namespace["_make"](*constants, *functions), source)
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
@@ -0,0 +1,645 @@
+"""Differential fuzzing of the evaluation engines of ScientificCalculator.py. Run python CalculatorFuzz.py --help
+for usage."""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorModel import *
+from CalculatorHistory import CalculationHistory
+from CalculatorIncremental import IncrementalEvaluator
+from decimal import Context, Decimal
+import argparse
+import importlib.util
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+FUZZ_SEED = 82
+DEFAULT_CASES = 2000
+DEFAULT_DEPTH = 5
+MINIMISE_ATTEMPTS = 2000
+# Number modes other than float are compared loosely, and not at all when rounding errors could have been
+# magnified by more than ILL_CONDITIONED, e.g. by cancellation or the sine of a huge angle.
+BACKEND_TOLERANCE = 1e-6
+ILL_CONDITIONED = 1e6
+# Expressions that once broke an engine, checked before the generated ones.
+REGRESSION_EXPRESSIONS = ("0.5+200!", "(200!+1)÷3", "1÷(3×10^5000)", "0^-1", "0.0^-2.5", "10^308×10.0",
+                          "10^308×10.0-10^308×10.0", "100001!", "100001!÷7+0.5")
+STRESS_CACHE_SIZE = 1024
+STRESS_WARM_UP = 0.25
+# History keeps an 8 byte offset per entry, so some growth is expected.
+STRESS_GROWTH_PER_EXPRESSION = 16
+STRESS_GROWTH_ALLOWANCE = 256 * 1024
+_ATOM_PRECEDENCE = 100
+
+# Kinds of generated nodes. Nodes are tuples of their kind and contents, e.g. (_BINARY, PLUS, left, right).
+_NUMBER = "number"
+_VARIABLE = "variable"
+_BINARY = "binary"
+_NEGATION = "negation"
+_FUNCTION = "function"
+_BARS = "bars"
+_FACTORIAL = "factorial"
+_BRACKETS = "brackets"
+_FUNCTION_NAMES = (SQUARE_ROOT,) + FUNCTIONS
+
+class ExpressionGenerator:
+    """Generates random valid expressions over the calculator's alphabet, with nesting, functions, absolute
+    value bars, factorials and scientific notation."""
+    def __init__(self, seed: int = FUZZ_SEED, max_depth: int = DEFAULT_DEPTH) -> None:
+        """Initialises a generator. The same seed always generates the same expressions."""
+        self._random = random.Random(seed)
+        self.max_depth = max_depth
+
+    def case(self) -> tuple:
+        """Return a generated tree and whether brackets left open at its end should be left unclosed."""
+        return self.node(0), self._random.random() < 0.1
+
+    def node(self, depth: int) -> tuple:
+        """Return a random tree no deeper than max_depth - depth."""
+        choose = self._random.random()
+        if depth >= self.max_depth or choose < 0.25:
+            return self.leaf()
+        if choose < 0.6:
+            return (_BINARY, self._random.choice(tuple(BINARY_PRECEDENCES)), self.node(depth + 1),
+                    self.node(depth + 1))
+        if choose < 0.7:
+            return (_NEGATION, self.node(depth + 1))
+        if choose < 0.85:
+            return (_FUNCTION, self._random.choice(_FUNCTION_NAMES), self.node(depth + 1))
+        if choose < 0.9:
+            return (_BARS, self.node(depth + 1))
+        if choose < 0.95:
+            # Factorials of large numbers are slow, so they are usually taken of small ones.
+            if self._random.random() < 0.7:
+                return (_FACTORIAL, (_NUMBER, str(self._random.randint(0, 20))))
+            return (_FACTORIAL, self.node(depth + 1))
+        return (_BRACKETS, self.node(depth + 1))
+
+    def leaf(self) -> tuple:
+        """Return a random number, variable or number in scientific notation."""
+        choose = self._random.random()
+        if choose < 0.1:
+            return (_VARIABLE, self._random.choice((ANSWER, MEMORY)))
+        if choose < 0.2:
+            exponent = (_NUMBER, str(self._random.randint(0, 30)))
+            if self._random.random() < 0.5:
+                exponent = (_NEGATION, exponent)
+            return (_BINARY, MULTIPLY, self.number(), (_BINARY, POWER, (_NUMBER, "10"), exponent))
+        return self.number()
+
+    def number(self) -> tuple:
+        """Return a random number literal, such as 12, 0.5, .5 or 5."""
+        digits = str(self._random.choice((self._random.randint(0, 9), self._random.randint(0, 999))))
+        choose = self._random.random()
+        if choose < 0.6:
+            return (_NUMBER, digits)
+        fraction = str(self._random.randint(0, 999))
+        if choose < 0.85:
+            return (_NUMBER, f"{digits}{DOT}{fraction}")
+        if choose < 0.95:
+            return (_NUMBER, f"{DOT}{fraction}")
+        return (_NUMBER, f"{digits}{DOT}")
+
+def _precedence(node: tuple) -> int:
+    """Return how tightly a node binds when written out."""
+    kind = node[0]
+    if kind == _BINARY:
+        return BINARY_PRECEDENCES[node[1]]
+    if kind == _NEGATION:
+        return NEGATION_PRECEDENCE
+    if kind == _FACTORIAL:
+        return FACTORIAL_PRECEDENCE
+    return _ATOM_PRECEDENCE
+
+def render(node: tuple) -> str:
+    """Write a tree as an expression, with only the brackets needed for it to parse back into the same
+    tree and those of _BRACKETS nodes."""
+    kind = node[0]
+    if kind == _NUMBER or kind == _VARIABLE:
+        return node[1]
+    if kind == _BINARY:
+        operator, left, right = node[1:]
+        precedence = BINARY_PRECEDENCES[operator]
+        right_associative = operator in RIGHT_ASSOCIATIVE
+        left_text = render(left)
+        if _precedence(left) < precedence or (_precedence(left) == precedence and right_associative):
+            left_text = LEFT_BRACKET + left_text + RIGHT_BRACKET
+        right_text = render(right)
+        # A negation on the right takes its operand before the operator can continue.
+        if right[0] != _NEGATION and (_precedence(right) < precedence
+                                      or (_precedence(right) == precedence and not right_associative)):
+            right_text = LEFT_BRACKET + right_text + RIGHT_BRACKET
+        return left_text + operator + right_text
+    if kind == _NEGATION:
+        operand = node[1]
+        if _precedence(operand) <= NEGATION_PRECEDENCE:
+            return MINUS + LEFT_BRACKET + render(operand) + RIGHT_BRACKET
+        return MINUS + render(operand)
+    if kind == _FUNCTION:
+        return node[1] + LEFT_BRACKET + render(node[2]) + RIGHT_BRACKET
+    if kind == _BARS:
+        return ABSOLUTE_BAR + render(node[1]) + ABSOLUTE_BAR
+    if kind == _FACTORIAL:
+        operand = node[1]
+        if _precedence(operand) < FACTORIAL_PRECEDENCE:
+            return LEFT_BRACKET + render(operand) + RIGHT_BRACKET + FACTORIAL
+        return render(operand) + FACTORIAL
+    return LEFT_BRACKET + render(node[1]) + RIGHT_BRACKET
+
+def render_case(node: tuple, leave_open: bool) -> str:
+    """Write a generated case as an expression, dropping the brackets closed at its very end if leave_open
+    is True, as the parser closes them implicitly."""
+    text = render(node)
+    return text.rstrip(RIGHT_BRACKET) if leave_open else text
+
+def reference_value(node: tuple, variables: dict) -> tuple:
+    """Evaluate a tree with Python's own arithmetic following the calculator's documented rules: ints stay
+    exact while results are whole, other results are floats and trigonometric functions use degrees.
+    Returns the value and its condition, roughly how many times larger than a rounding error its relative
+    error can be. Raises one of MATH_EXCEPTIONS where the calculator gives MATH_ERROR."""
+    kind = node[0]
+    if kind == _NUMBER:
+        return (float(node[1]) if DOT in node[1] else int(node[1])), 1.0
+    if kind == _VARIABLE:
+        return variables[node[1]], 1.0
+    if kind == _BINARY:
+        operator = node[1]
+        left, left_condition = reference_value(node[2], variables)
+        right, right_condition = reference_value(node[3], variables)
+        value = _reference_binary(operator, left, right)
+        if operator == PLUS or operator == MINUS:
+            # Cancellation magnifies the errors of the operands.
+            condition = _ratio(_magnitude(left) * left_condition + _magnitude(right) * right_condition,
+                               _magnitude(value))
+        elif operator == POWER:
+            condition = _magnitude(right) * (left_condition + abs(_log(left)) * right_condition)
+            if not right:
+                # Anything to the power of an exact zero is exactly one.
+                condition = 0.0 if math.isfinite(right_condition) else math.inf
+        else:
+            condition = left_condition + right_condition
+        if _out_of_range(operator, left, right, value):
+            condition = math.inf
+        return value, condition + 1.0
+
+    operand, condition = reference_value(node[-1], variables)
+    if kind == _NEGATION:
+        return -operand, condition
+    if kind == _BARS:
+        return abs(operand), condition
+    if kind == _BRACKETS:
+        return operand, condition
+    if kind == _FACTORIAL:
+        value = _reference_factorial(operand)
+        if type(value) is Decimal or _out_of_range(FACTORIAL, operand, None, value):
+            return value, math.inf
+        return value, condition * (1.0 + _magnitude(operand) * _log(operand + 2)) + 1.0
+    name = node[1]
+    value = _reference_function(name, operand)
+    if name == SQUARE_ROOT or name == ABSOLUTE_VALUE:
+        return value, condition + 1.0
+    if name == LOG or name == LN:
+        return value, _ratio(condition, abs(_log(operand))) + 1.0
+    # Trigonometric functions of large angles or near their zeros magnify the error of the angle.
+    angle = _ratio(_magnitude(operand) * math.pi, 180.0)
+    sine = _magnitude(_reference_function(SIN, operand))
+    cosine = _magnitude(_reference_function(COS, operand))
+    if name == SIN:
+        return value, condition * _ratio(angle * cosine, sine) + 1.0
+    if name == COS:
+        return value, condition * _ratio(angle * sine, cosine) + 1.0
+    return value, condition * _ratio(angle, sine * cosine) + 1.0
+
+def _magnitude(value) -> float:
+    """Return the absolute value of a number as a float, or infinity if it is too large for one."""
+    try:
+        return abs(float(value))
+    except OverflowError:
+        return math.inf
+
+def _out_of_range(operator: str, left, right, value) -> bool:
+    """Return whether a float result overflowed or underflowed, losing all of its precision, or an int
+    result is too large for a float, which engines working in floats can not follow."""
+    if type(value) is int:
+        return _magnitude(value) == math.inf
+    if type(value) is not float:
+        return False
+    if value:
+        return not sys.float_info.min <= abs(value) < math.inf
+    # Sums of opposites are exactly zero, as are products with zero.
+    return operator != PLUS and operator != MINUS and bool(left) and (bool(right) or operator == DIVIDE)
+
+def _log(value) -> float:
+    """Return the natural logarithm of the magnitude of a number, or minus infinity for zero."""
+    value = abs(value)
+    return math.log(value) if value else -math.inf
+
+def _ratio(numerator: float, denominator: float) -> float:
+    """Divide two magnitudes, giving infinity for anything non-zero over zero and zero for zero over
+    anything."""
+    if not numerator:
+        return 0.0
+    if not denominator or math.isinf(numerator):
+        return math.inf
+    return numerator / denominator
+
+def _reference_binary(operator: str, left, right):
+    """Apply a binary operator as the calculator documents it."""
+    if operator == PLUS:
+        return left + right
+    if operator == MINUS:
+        return left - right
+    if operator == MULTIPLY:
+        return left * right
+    if operator == DIVIDE:
+        if type(left) is int and type(right) is int and left % right == 0:
+            return left // right
+        return left / right
+    if type(left) is int and type(right) is int and right >= 0:
+        if abs(left) <= 1 or right * left.bit_length() <= MAX_EXACT_POWER_BITS:
+            return left ** right
+    return math.pow(left, right)
+
+def _reference_factorial(value):
+    """Return the factorial of a whole number, exactly for ints and floats too large for the gamma function,
+    and roughly as a Decimal above EXACT_FACTORIAL_LIMIT."""
+    if type(value) is int or value > FLOAT_FACTORIAL_LIMIT:
+        if value < 0:
+            raise ValueError("Factorial of a negative number")
+        if value % 1:
+            raise ValueError("Factorial of a fractional number")
+        if value > EXACT_FACTORIAL_LIMIT:
+            logarithm = math.lgamma(value + 1) / math.log(10)
+            if logarithm >= Context().Emax + 1:
+                raise OverflowError("Factorial is too large")
+            return Decimal(10 ** (logarithm % 1)).scaleb(int(logarithm))
+        return math.factorial(int(value))
+    if value < 0 or not value.is_integer():
+        raise ValueError("Factorial of a negative or fractional number")
+    return math.gamma(value + 1)
+
+def _reference_function(name: str, value):
+    """Apply a function as the calculator documents it, with angles in degrees."""
+    if name == SQUARE_ROOT:
+        if type(value) is int and value >= 0 and math.isqrt(value) ** 2 == value:
+            return math.isqrt(value)
+        return math.sqrt(value)
+    if name == ABSOLUTE_VALUE:
+        return abs(value)
+    if name == LOG:
+        return math.log10(value)
+    if name == LN:
+        return math.log(value)
+    sine = round(math.sin(math.radians(value)), TRIGONOMETRY_DIGITS)
+    cosine = round(math.cos(math.radians(value)), TRIGONOMETRY_DIGITS)
+    if name == SIN:
+        return sine
+    if name == COS:
+        return cosine
+    return sine / cosine
+
+def _outcome(function, *arguments) -> tuple:
+    """Call function and return ("value", result), (SYNTAX_ERROR,) or (MATH_ERROR,)."""
+    try:
+        return ("value", function(*arguments))
+    except ExpressionSyntaxError:
+        return (SYNTAX_ERROR,)
+    except MATH_EXCEPTIONS:
+        return (MATH_ERROR,)
+
+def _identical(expected: tuple, actual: tuple) -> bool:
+    """Return whether two outcomes are the same, down to the type of their values."""
+    if expected[0] != actual[0] or len(expected) == 1:
+        return expected[0] == actual[0]
+    expected, actual = expected[1], actual[1]
+    return type(expected) is type(actual) and (expected == actual or (expected != expected and actual != actual))
+
+def _close(expected, actual, tolerance: float) -> bool:
+    """Return whether two numbers are equal to within a relative tolerance."""
+    if type(expected) is int and type(actual) is int:
+        return expected == actual
+    try:
+        expected, actual = float(expected), float(actual)
+    except OverflowError:
+        return expected == actual
+    if expected != expected or actual != actual:
+        return expected != expected and actual != actual
+    return expected == actual or math.isclose(expected, actual, rel_tol=tolerance)
+
+def _show(outcome: tuple) -> str:
+    """Describe an outcome for a report."""
+    return outcome[0] if len(outcome) == 1 else repr(outcome[1])
+
+class Mismatch:
+    """An expression on which an engine disagreed with the result expected of it."""
+    __slots__ = ("engine", "expression", "expected", "actual", "minimised")
+
+    def __init__(self, engine: str, expression: str, expected: str, actual: str) -> None:
+        self.engine = engine
+        self.expression = expression
+        self.expected = expected
+        self.actual = actual
+        self.minimised = expression
+
+    def __str__(self) -> str:
+        if self.minimised == self.expression:
+            return f"{self.engine}: {self.expression!r} expected {self.expected}, got {self.actual}"
+        return (f"{self.engine}: {self.minimised!r} (minimised from {self.expression!r}) "
+                f"expected {self.expected}, got {self.actual}")
+
+class DifferentialChecker:
+    """Evaluates an expression with every engine and reports those that disagree with
+    CalculationProcessor.evaluate. Engines that share the float backend must agree exactly: process_input,
+    the compiled callable, the unoptimised program and IncrementalEvaluator. The Python reference must
+    agree to within rounding, and other number modes and the vectorised engine of compile_array, which works
+    in float64 throughout, to within BACKEND_TOLERANCE. Every number mode must be able to display its result."""
+    def __init__(self, number_modes: tuple = (FRACTION_MODE, DECIMAL_MODE), arrays: bool = True) -> None:
+        """Initialises a checker comparing the float engines with processors in number_modes, and with
+        compile_array if arrays is True, which requires NumPy."""
+        self.processor = CalculationProcessor()
+        self.arrays = arrays
+        self._incremental = IncrementalEvaluator(self.processor)
+        self._backends = {mode: CalculationProcessor(number_mode=mode) for mode in number_modes}
+        self.checks = 0
+        self.skipped = 0
+
+    def set_variables(self, variables: dict) -> None:
+        """Set Ans and M for every processor."""
+        self.processor._variables.update(variables)
+        for processor in self._backends.values():
+            processor._variables.update({name: processor._backend.convert(value)
+                                         for name, value in variables.items()})
+
+    def check(self, expression: str, tree: tuple = None) -> list:
+        """Return a Mismatch for each engine disagreeing on expression. tree, if given, is the generated tree
+        the expression was written from, which the Python reference evaluates."""
+        processor = self.processor
+        self.checks += 1
+        expected = _outcome(processor.evaluate, expression)
+        mismatches = []
+
+        def compare(engine: str, actual: tuple) -> None:
+            if not _identical(expected, actual):
+                mismatches.append(Mismatch(engine, expression, _show(expected), _show(actual)))
+
+        shown = processor.process_input(expression, remember_answer=False)
+        if expected[0] == "value":
+            if shown != processor.format_result(expected[1]):
+                mismatches.append(Mismatch("process_input", expression, processor.format_result(expected[1]),
+                                           shown))
+        elif shown != expected[0]:
+            mismatches.append(Mismatch("process_input", expression, expected[0], shown))
+
+        compare("incremental", _outcome(self._incremental.update, expression))
+        compare("callable", _outcome(lambda: processor.compile(expression)()))
+        compare("unoptimised", _outcome(self._unoptimised, expression))
+        self._check_display(expression, mismatches)
+
+        if tree is not None:
+            reference = _outcome(reference_value, tree, processor._variables)
+            if reference[0] == "value":
+                value, condition = reference[1]
+                # The calculator gives MATH_ERROR for infinite and NaN float results.
+                finite = type(value) is not float or math.isfinite(value)
+                reference = ("value", value) if finite else (MATH_ERROR,)
+            if expected[0] != reference[0] or (expected[0] == "value"
+                                               and not _close(value, expected[1], 1e-12)):
+                mismatches.append(Mismatch("python", expression, _show(reference), _show(expected)))
+            elif expected[0] == "value":
+                self._check_backends(expression, expected[1], condition, mismatches)
+            if self.arrays and expected[0] == reference[0]:
+                # Ints too large for a float give results the vectorised engine can not follow, even where
+                # they no longer affect the result, e.g. 239.!^0.
+                if _beyond_float(tree, processor._variables):
+                    condition = math.inf
+                elif expected[0] != "value":
+                    condition = 1.0
+                self._check_array(expression, expected, condition, mismatches)
+        return mismatches
+
+    def _unoptimised(self, expression: str):
+        """Evaluate expression from its parsed tree without the optimiser."""
+        processor = self.processor
+        tree = Parser(tokenize(expression), processor._make_number).parse()
+        compiled = CompiledExpression(expression, expression, tree, processor, optimise_tree=False)
+        return compiled.evaluate(processor._variables)
+
+    def _check_display(self, expression: str, mismatches: list) -> None:
+        """Check that every number mode can format the result of expression as a fraction, as a decimal and
+        exactly, and that the display shows a number rather than e.g. infinity."""
+        for mode, processor in ((FLOAT_MODE, self.processor),) + tuple(self._backends.items()):
+            outcome = _outcome(processor.evaluate, expression)
+            if outcome[0] != "value":
+                continue
+            for exact, fraction in ((False, None), (False, True), (False, False), (True, None)):
+                try:
+                    shown = processor.format_result(outcome[1], exact, fraction)
+                except Exception as exception:
+                    mismatches.append(Mismatch(f"{mode} display", expression, "a result", repr(exception)))
+                    break
+                if not exact and any(character.isalpha() for character in shown):
+                    mismatches.append(Mismatch(f"{mode} display", expression, "a number", repr(shown)))
+                    break
+
+    def _check_backends(self, expression: str, value, condition: float, mismatches: list) -> None:
+        """Compare the other number modes with a float result, where it is well conditioned."""
+        if not math.isfinite(_magnitude(value)) or not condition <= ILL_CONDITIONED:
+            self.skipped += 1
+            return
+        for mode, processor in self._backends.items():
+            outcome = _outcome(processor.evaluate, expression)
+            if outcome[0] == "value" and not _close(value, outcome[1], BACKEND_TOLERANCE):
+                mismatches.append(Mismatch(mode, expression, repr(value), _show(outcome)))
+
+    def _check_array(self, expression: str, expected: tuple, condition: float, mismatches: list) -> None:
+        """Compare the vectorised engine, which works in float64 throughout, with an outcome where it is well
+        conditioned, so e.g. 200!÷199! is skipped as 200! is too large for a float."""
+        if not condition <= ILL_CONDITIONED:
+            return
+        result = self.processor.compile_array(expression)()
+        error = bool(result.errors)
+        if expected[0] != "value":
+            if not error:
+                mismatches.append(Mismatch("array", expression, expected[0], repr(float(result.values))))
+            return
+        value = expected[1]
+        if not math.isfinite(_magnitude(value)):
+            return
+        if error or not _close(value, float(result.values), BACKEND_TOLERANCE):
+            mismatches.append(Mismatch("array", expression, repr(value),
+                                       MATH_ERROR if error else repr(float(result.values))))
+
+def _beyond_float(node: tuple, variables: dict) -> bool:
+    """Return whether any part of a tree evaluates to an int too large for a float."""
+    if any(_beyond_float(child, variables) for child in _children(node)):
+        return True
+    outcome = _outcome(reference_value, node, variables)
+    return outcome[0] == "value" and type(outcome[1][0]) is int and _magnitude(outcome[1][0]) == math.inf
+
+def _children(node: tuple) -> tuple:
+    """Return the subtrees of a node."""
+    kind = node[0]
+    if kind == _BINARY:
+        return node[2:]
+    if kind == _NUMBER or kind == _VARIABLE:
+        return ()
+    return (node[-1],)
+
+def _size(node: tuple) -> tuple:
+    """Return how complicated a tree is, for minimising: its node count, then its written length."""
+    count = 1 + sum(_size(child)[0] for child in _children(node))
+    return count, len(render(node))
+
+def _simplifications(node: tuple):
+    """Yield trees that are one step simpler than node."""
+    children = _children(node)
+    yield from children
+    if node[0] == _VARIABLE or (node[0] == _NUMBER and node[1] != "1"):
+        yield (_NUMBER, "1")
+    # Children are always the last items of a node.
+    first = len(node) - len(children)
+    for index, child in enumerate(children, first):
+        for simpler in _simplifications(child):
+            yield node[:index] + (simpler,) + node[index + 1:]
+
+def minimise(tree: tuple, leave_open: bool, still_fails) -> tuple:
+    """Greedily simplify tree while still_fails(tree, expression) holds and return the simplest found."""
+    attempts = 0
+    size = _size(tree)
+    simplified = True
+    while simplified and attempts < MINIMISE_ATTEMPTS:
+        simplified = False
+        for candidate in _simplifications(tree):
+            attempts += 1
+            candidate_size = _size(candidate)
+            if candidate_size < size and still_fails(candidate, render_case(candidate, leave_open)):
+                tree, size, simplified = candidate, candidate_size, True
+                break
+            if attempts >= MINIMISE_ATTEMPTS:
+                break
+    return tree
+
+def fuzz(cases: int = DEFAULT_CASES, seed: int = FUZZ_SEED, max_depth: int = DEFAULT_DEPTH,
+         number_modes: tuple = (FRACTION_MODE, DECIMAL_MODE), arrays: bool = True) -> tuple:
+    """Check cases generated expressions and return the minimised mismatches and the checker."""
+    generator = ExpressionGenerator(seed, max_depth)
+    checker = DifferentialChecker(number_modes, arrays)
+    variable_random = random.Random(seed)
+    checker.set_variables({ANSWER: 0, MEMORY: 0})
+    found = [mismatch for expression in REGRESSION_EXPRESSIONS for mismatch in checker.check(expression)]
+    for case in range(cases):
+        variables = {ANSWER: variable_random.choice((0, 7, -2.5, 1e20)), MEMORY: variable_random.choice((0, 3, 0.1))}
+        checker.set_variables(variables)
+        tree, leave_open = generator.case()
+        expression = render_case(tree, leave_open)
+        mismatches = checker.check(expression, tree)
+        if mismatches:
+            engines = {mismatch.engine for mismatch in mismatches}
+
+            def still_fails(candidate: tuple, candidate_expression: str) -> bool:
+                return any(mismatch.engine in engines for mismatch in checker.check(candidate_expression, candidate))
+
+            # Report what the engines give for the minimised expression, falling back to the original.
+            minimised_tree = minimise(tree, leave_open, still_fails)
+            minimised = render_case(minimised_tree, leave_open)
+            if minimised != expression:
+                mismatches = [mismatch for mismatch in checker.check(minimised, minimised_tree)
+                              if mismatch.engine in engines] or mismatches
+            for mismatch in mismatches:
+                mismatch.expression = expression
+                mismatch.minimised = minimised
+                found.append(mismatch)
+    return found, checker
+
+def stress(seconds: float, seed: int = FUZZ_SEED, max_depth: int = DEFAULT_DEPTH,
+           cache_size: int = STRESS_CACHE_SIZE) -> dict:
+    """Evaluate generated expressions through a caching processor, recording each in a CalculationHistory,
+    for seconds. Memory is traced once the first STRESS_WARM_UP of the time has filled the caches, and the
+    growth after that is reported along with throughput. Growth of more than STRESS_GROWTH_ALLOWANCE beyond
+    STRESS_GROWTH_PER_EXPRESSION bytes per expression suggests a leak, and the allocation sites that grew
+    most are listed."""
+    generator = ExpressionGenerator(seed, max_depth)
+    processor = CalculationProcessor(cache_size)
+    history = CalculationHistory()
+    tracemalloc.start()
+    start = time.perf_counter()
+    warm_up_end = start + seconds * STRESS_WARM_UP
+    end = start + seconds
+    evaluating = 0.0
+    expressions = 0
+    baseline = None
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            if baseline is None and now >= warm_up_end:
+                baseline = (tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[0], expressions)
+            tree, leave_open = generator.case()
+            expression = render_case(tree, leave_open)
+            evaluation_start = time.perf_counter()
+            result = processor.process_input(expression)
+            history.append(expression, result)
+            evaluating += time.perf_counter() - evaluation_start
+            expressions += 1
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        history.close()
+
+    if baseline is None:
+        baseline = (snapshot, current, 0)
+    baseline_snapshot, baseline_memory, baseline_expressions = baseline
+    measured = expressions - baseline_expressions
+    growth = current - baseline_memory
+    per_expression = growth / measured if measured else 0.0
+    leaking = growth - measured * STRESS_GROWTH_PER_EXPRESSION > STRESS_GROWTH_ALLOWANCE
+    growing = [str(difference) for difference in snapshot.compare_to(baseline_snapshot, "lineno")[:5]
+               if difference.size_diff > 0]
+    return {"expressions": expressions, "expressions_per_second": expressions / evaluating if evaluating else 0.0,
+            "growth_bytes": growth, "growth_per_expression": per_expression, "peak_bytes": peak,
+            "leaking": leaking, "growing": growing}
+
+def parse_arguments(arguments: list = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=f"{APP_TITLE} differential fuzzing")
+    parser.add_argument("--cases", type=int, default=DEFAULT_CASES, help="number of expressions to check")
+    parser.add_argument("--seed", type=int, default=FUZZ_SEED, help="seed of the expression generator")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="deepest nesting of generated expressions")
+    parser.add_argument("--mode", action="append", choices=(FRACTION_MODE, DECIMAL_MODE),
+                        help="also compare this number mode (may be repeated, default both)")
+    parser.add_argument("--stress", type=float, metavar="SECONDS",
+                        help="instead run a sustained throughput test for SECONDS, checking memory growth")
+    return parser.parse_args(arguments)
+
+def main() -> int:
+    """Run the requested checks and return a non-zero exit status on a mismatch or memory growth."""
+    arguments = parse_arguments()
+    if arguments.stress is not None:
+        results = stress(arguments.stress, arguments.seed, arguments.depth)
+        print(f"{results['expressions']} expressions ({results['expressions_per_second']:.0f}/s evaluating "
+              f"under tracemalloc), grew {results['growth_bytes'] / 1024:.1f}KiB after warm up "
+              f"({results['growth_per_expression']:.1f} bytes per expression), "
+              f"peak {results['peak_bytes'] / 1024:.1f}KiB")
+        if results["leaking"]:
+            print("MEMORY GROWTH:")
+            for line in results["growing"]:
+                print(f"  {line}")
+        return 1 if results["leaking"] else 0
+
+    modes = tuple(arguments.mode) if arguments.mode else (FRACTION_MODE, DECIMAL_MODE)
+    # The vectorised engine is only compared where NumPy is installed.
+    arrays = importlib.util.find_spec("numpy") is not None
+    mismatches, checker = fuzz(arguments.cases, arguments.seed, arguments.depth, modes, arrays)
+    print(f"{arguments.cases} expressions, {len(mismatches)} mismatches, "
+          f"{checker.skipped} ill-conditioned results not compared across number modes")
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
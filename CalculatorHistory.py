@@ -0,0 +1,168 @@
+"""Calculation history for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from array import array
+import bisect
+import mmap
+import os
+import tempfile
+
+_FIELD_SEPARATOR = b"\x1f"
+_RECORD_END = b"\n"
+
+class HistoryEntry:
+    """One calculation in the history."""
+    __slots__ = ("index", "expression", "result")
+
+    def __init__(self, index: int, expression: str, result: str) -> None:
+        self.index = index
+        self.expression = expression
+        self.result = result
+
+    def __repr__(self) -> str:
+        return f"HistoryEntry({self.index}, {self.expression!r}, {self.result!r})"
+
+class CalculationHistory:
+    """An append-only log of expressions and the results shown for them. Entries are written to a file as
+    they are added and only the offset of each one is kept in memory, 8 bytes per entry, so a session can
+    hold millions. Entries are read back through a memory map of the file, and searches run over the map
+    without reading entries into Python objects."""
+    def __init__(self, path: str = None) -> None:
+        """Initialises a history stored at path, indexing the entries already there, or in a temporary file
+        deleted when the history is closed if path is None."""
+        if path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._file = open(path, "a+b")
+        self._offsets = array("Q")
+        self._size = self._file.seek(0, os.SEEK_END)
+        self._map = None
+        if self._size:
+            self._index_existing()
+
+    def _index_existing(self) -> None:
+        """Record the offset of every complete entry already in the file. A partly written last entry,
+        e.g. from a crash, is cut off."""
+        data = self._mapped()
+        offsets = self._offsets
+        start = 0
+        end = data.find(_RECORD_END)
+        while end != -1:
+            offsets.append(start)
+            start = end + 1
+            end = data.find(_RECORD_END, start)
+        if start != self._size:
+            self._close_map()
+            self._file.truncate(start)
+            self._size = start
+
+    def append(self, expression: str, result: str) -> int:
+        """Add an entry and return its index. Raises ValueError if either text contains a line break or
+        the field separator."""
+        record = expression.encode("utf-8") + _FIELD_SEPARATOR + result.encode("utf-8")
+        if record.count(_FIELD_SEPARATOR) != 1 or _RECORD_END in record:
+            raise ValueError("History entries can not contain line breaks or unit separators")
+        self._file.write(record + _RECORD_END)
+        self._file.flush()
+        self._offsets.append(self._size)
+        self._size += len(record) + 1
+        return len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> HistoryEntry:
+        """Return the entry at index. Negative indexes count back from the latest entry."""
+        count = len(self._offsets)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("History index out of range")
+        start = self._offsets[index]
+        end = self._offsets[index + 1] - 1 if index + 1 < count else self._size - 1
+        expression, result = self._mapped()[start:end].split(_FIELD_SEPARATOR)
+        return HistoryEntry(index, expression.decode("utf-8"), result.decode("utf-8"))
+
+    def search_back(self, text: str, before: int = None, prefix: bool = True) -> HistoryEntry:
+        """Return the latest entry before index before, or before the end if None, whose expression starts
+        with text, or contains it if prefix is False. Returns None if there is no such entry."""
+        prefix = prefix or not text
+        offsets = self._offsets
+        count = len(offsets)
+        before = count if before is None else min(before, count)
+        if before <= 0:
+            return None
+        data = self._mapped()
+        pattern, shift = self._pattern(text, prefix)
+        end = offsets[before] if before < count else self._size
+        while True:
+            position = data.rfind(pattern, 0, end)
+            if position == -1:
+                break
+            index = bisect.bisect_right(offsets, position + shift) - 1
+            if index < before and self._in_expression(index, position + len(pattern)):
+                return self[index]
+            end = position + len(pattern) - 1
+        if prefix and self[0].expression.startswith(text):
+            return self[0]
+        return None
+
+    def search_forward(self, text: str, after: int = -1, prefix: bool = True) -> HistoryEntry:
+        """Return the earliest entry after index after whose expression starts with text, or contains it
+        if prefix is False. Returns None if there is no such entry."""
+        prefix = prefix or not text
+        offsets = self._offsets
+        count = len(offsets)
+        after = max(after, -1)
+        if prefix and after == -1 and count and self[0].expression.startswith(text):
+            return self[0]
+        if prefix:
+            after = max(after, 0)
+        if after + 1 >= count:
+            return None
+        data = self._mapped()
+        pattern, shift = self._pattern(text, prefix)
+        start = offsets[after + 1] - shift
+        while True:
+            position = data.find(pattern, start, self._size)
+            if position == -1:
+                return None
+            index = bisect.bisect_right(offsets, position + shift) - 1
+            if self._in_expression(index, position + len(pattern)):
+                return self[index]
+            start = position + 1
+
+    def _pattern(self, text: str, prefix: bool) -> tuple:
+        """Return the bytes to search for and how far into them the text starts. Prefix searches look for
+        the text straight after the end of an entry, so they can not find the first entry."""
+        encoded = text.encode("utf-8")
+        if prefix:
+            return _RECORD_END + encoded, 1
+        return encoded, 0
+
+    def _in_expression(self, index: int, end: int) -> bool:
+        """Return whether a match ending at offset end lies within the expression of entry index."""
+        return end <= self._mapped().find(_FIELD_SEPARATOR, self._offsets[index])
+
+    def _mapped(self) -> mmap.mmap:
+        """Return a read-only map of the file, remapping it if entries were added since it was mapped."""
+        if self._map is None or len(self._map) < self._size:
+            self._close_map()
+            self._map = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _close_map(self) -> None:
+        """Close the current map, if any."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self) -> None:
+        """Close the file. A temporary history is deleted."""
+        self._close_map()
+        self._file.close()
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
@@ -0,0 +1,237 @@
+"""Incremental evaluation of an expression as it is typed for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorParser import ExpressionSyntaxError, tokenize
+from CalculatorModel import MATH_EXCEPTIONS, finite_result
+import bisect
+
+# Kinds of pending operators.
+_BINARY = 0
+_PREFIX = 1
+_OPEN = 2
+
+class PreviewLimitExceeded(Exception):
+    """Raised when an operation is skipped because its operands are larger than the evaluator's limits."""
+
+class _Failure:
+    """Stands in for an operand whose evaluation raised one of MATH_EXCEPTIONS."""
+    __slots__ = ("exception",)
+
+    def __init__(self, exception: Exception) -> None:
+        self.exception = exception
+
+class _ParseState:
+    """The parser state after a token. Operands and operators are immutable linked stacks of
+    (top, rest) pairs, so every earlier state stays valid while later ones are built on top of it."""
+    __slots__ = ("operands", "operators", "expecting_operand", "after_function", "syntax_error")
+
+    def __init__(self, operands, operators, expecting_operand: bool, after_function: bool = False,
+                 syntax_error: bool = False) -> None:
+        self.operands = operands
+        self.operators = operators
+        self.expecting_operand = expecting_operand
+        self.after_function = after_function
+        self.syntax_error = syntax_error
+
+_INITIAL_STATE = _ParseState(None, None, True)
+_SYNTAX_ERROR_STATE = _ParseState(None, None, False, syntax_error=True)
+
+class IncrementalEvaluator:
+    """Evaluates an expression that is edited a little at a time, such as input being typed. The parser
+    state after each token is kept, so an edit only re-tokenizes and re-evaluates the tokens from the
+    edit onwards. Operators are evaluated as soon as their precedence allows, so the result of a
+    prefix is ready without walking the whole expression. Results match CalculationProcessor.evaluate."""
+    def __init__(self, processor, max_bits: int = None, factorial_limit: int = None) -> None:
+        """Initialises an evaluator for an empty input using the operations of the given processor. Operations
+        on ints of more than max_bits, and factorials of numbers above factorial_limit, are skipped, raising
+        PreviewLimitExceeded, so no single operation takes long. None means no limit."""
+        self._processor = processor
+        self._max_bits = max_bits
+        self._factorial_limit = factorial_limit
+        self._text = BLANK
+        self._tokens = []
+        self._token_ends = []
+        self._states = [_INITIAL_STATE]
+        self._dependencies = None
+
+    def update(self, text: str):
+        """Replace the input with text and return its value. Raises ExpressionSyntaxError if the input is
+        incomplete or invalid, or one of MATH_EXCEPTIONS if it can not be evaluated."""
+        return self._finish(self._synchronise(text))
+
+    def preview(self, text: str) -> str:
+        """Replace the input with text and return its result formatted for display. Incomplete or invalid
+        input gives BLANK, as it is usually still being typed, as does input beyond the evaluator's limits."""
+        try:
+            return self._processor.format_result(self.update(text))
+        except (ExpressionSyntaxError, PreviewLimitExceeded):
+            return BLANK
+        except MATH_EXCEPTIONS:
+            return MATH_ERROR
+
+    def reset(self) -> None:
+        """Discard all kept parser states."""
+        self._text = BLANK
+        del self._tokens[:], self._token_ends[:], self._states[1:]
+
+    def _synchronise(self, text: str) -> _ParseState:
+        """Bring the kept tokens and states up to date with text, keeping those before the first change,
+        and return the state at the end of text."""
+        processor = self._processor
+        dependencies = (processor.angle_mode, processor._backend.key,
+                        tuple((name, type(value), value) for name, value in processor._variables.items()))
+        if dependencies != self._dependencies:
+            self._dependencies = dependencies
+            self.reset()
+
+        old_text = self._text
+        unchanged = min(len(old_text), len(text))
+        if text[:unchanged] != old_text[:unchanged]:
+            low, high = 0, unchanged
+            while low < high:
+                middle = (low + high + 1) // 2
+                if text[:middle] == old_text[:middle]:
+                    low = middle
+                else:
+                    high = middle - 1
+            unchanged = low
+
+        # A token ending where the change starts may be extended by it, e.g. 12 becoming 123.
+        kept = bisect.bisect_left(self._token_ends, unchanged)
+        del self._tokens[kept:], self._token_ends[kept:], self._states[kept + 1:]
+        start = self._token_ends[-1] if kept else 0
+        try:
+            new_tokens = tokenize(text, start)[:-1]
+        except ExpressionSyntaxError:
+            self._text = text[:start]
+            return _SYNTAX_ERROR_STATE
+
+        state = self._states[-1]
+        for token in new_tokens:
+            state = self._advance(state, token)
+            self._tokens.append(token)
+            self._token_ends.append(token.position + len(token.text))
+            self._states.append(state)
+        self._text = text[:self._token_ends[-1]] if self._token_ends else BLANK
+        return state
+
+    def _apply(self, function, *operands):
+        """Apply an operation, turning math exceptions into a _Failure that propagates through later
+        operations."""
+        max_bits = self._max_bits
+        for operand in operands:
+            if type(operand) is _Failure:
+                return operand
+            if max_bits is not None and type(operand) is int and operand.bit_length() > max_bits:
+                return _Failure(PreviewLimitExceeded("Operand is too large to preview"))
+        try:
+            return function(*operands)
+        except MATH_EXCEPTIONS as exception:
+            return _Failure(exception)
+
+    def _reduce(self, operators, operands, binding: int) -> tuple:
+        """Apply pending operators that bind at least as tightly as binding, stopping at an open bracket."""
+        processor = self._processor
+        while operators is not None:
+            kind, symbol, right_binding = operators[0]
+            if kind == _OPEN or binding > right_binding:
+                break
+            operators = operators[1]
+            if kind == _BINARY:
+                right, operands = operands
+                left, operands = operands
+                operands = (self._apply(processor._binary_operations[symbol], left, right), operands)
+            else:
+                operand, operands = operands
+                operands = (self._apply(processor._unary_operations[symbol], operand), operands)
+        return operators, operands
+
+    def _advance(self, state: _ParseState, token) -> _ParseState:
+        """Return the state after the given token follows state."""
+        if state.syntax_error:
+            return state
+        kind = token.kind
+        text = token.text
+        operands = state.operands
+        operators = state.operators
+        processor = self._processor
+
+        if state.expecting_operand:
+            if kind is NUMBER_TOKEN:
+                return _ParseState((processor._make_number(text), operands), operators, False)
+            elif kind is NAME_TOKEN:
+                if text in FUNCTIONS:
+                    return _ParseState(operands, ((_PREFIX, text, FUNCTION_PRECEDENCE), operators), True, True)
+                value = processor._variables.get(text)
+                if value is not None:
+                    return _ParseState((value, operands), operators, False)
+            elif text == LEFT_BRACKET:
+                if state.after_function:
+                    # The function was called with brackets, so it applies once they close.
+                    operators = ((_OPEN, operators[0][1], 0), operators[1])
+                else:
+                    operators = ((_OPEN, LEFT_BRACKET, 0), operators)
+                return _ParseState(operands, operators, True)
+            elif text == MINUS:
+                return _ParseState(operands, ((_PREFIX, MINUS, NEGATION_PRECEDENCE), operators), True)
+            elif text == SQUARE_ROOT:
+                return _ParseState(operands, ((_PREFIX, SQUARE_ROOT, FUNCTION_PRECEDENCE), operators), True, True)
+            elif text == ABSOLUTE_BAR:
+                return _ParseState(operands, ((_OPEN, ABSOLUTE_BAR, 0), operators), True)
+            return _SYNTAX_ERROR_STATE
+
+        if kind is not SYMBOL_TOKEN:
+            return _SYNTAX_ERROR_STATE
+        if text == FACTORIAL:
+            operand, rest = operands
+            factorial_limit = self._factorial_limit
+            if factorial_limit is not None and type(operand) is not _Failure and operand > factorial_limit:
+                operand = _Failure(PreviewLimitExceeded("Factorial is too large to preview"))
+            return _ParseState((self._apply(processor._unary_operations[FACTORIAL], operand), rest),
+                               operators, False)
+
+        binding = BINARY_PRECEDENCES.get(text)
+        if binding is not None:
+            operators, operands = self._reduce(operators, operands, binding)
+            right_binding = binding - 1 if text in RIGHT_ASSOCIATIVE else binding
+            return _ParseState(operands, ((_BINARY, text, right_binding), operators), True)
+
+        if text == RIGHT_BRACKET or text == ABSOLUTE_BAR:
+            operators, operands = self._reduce(operators, operands, -1)
+            if operators is None:
+                return _SYNTAX_ERROR_STATE
+            opened = operators[0][1]
+            if (opened == ABSOLUTE_BAR) != (text == ABSOLUTE_BAR):
+                return _SYNTAX_ERROR_STATE
+            operators = operators[1]
+            if opened != LEFT_BRACKET:
+                operand, operands = operands
+                function = processor._unary_operations[ABSOLUTE_VALUE if opened == ABSOLUTE_BAR else opened]
+                operands = (self._apply(function, operand), operands)
+            return _ParseState(operands, operators, False)
+        return _SYNTAX_ERROR_STATE
+
+    def _finish(self, state: _ParseState):
+        """Apply everything still pending in state, implicitly closing open brackets, and return the value."""
+        if state.syntax_error or state.expecting_operand:
+            raise ExpressionSyntaxError("Incomplete or invalid expression")
+        operators, operands = self._reduce(state.operators, state.operands, -1)
+        while operators is not None:
+            opened = operators[0][1]
+            if opened == ABSOLUTE_BAR:
+                raise ExpressionSyntaxError("Unclosed absolute value")
+            operators = operators[1]
+            if opened != LEFT_BRACKET:
+                operand, operands = operands
+                operands = (self._apply(self._processor._unary_operations[opened], operand), operands)
+            operators, operands = self._reduce(operators, operands, -1)
+
+        value = operands[0]
+        if type(value) is _Failure:
+            raise value.exception
+        return finite_result(value)
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
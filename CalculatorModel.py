@@ -3,136 +3,487 @@
 __author__= "Mitchell Clark"
 
 from Constants import *
+from CalculatorParser import *
+from CalculatorCache import PersistentResultCache, ResultCache
+from CalculatorOptimiser import optimise
+from CalculatorNumbers import MATH_EXCEPTIONS, approximate_factorial, exact_digits, exact_factorial, finite_result, format_number, leading_digits, make_backend
 import math
+import operator
+import time
+
+class EvaluationCancelled(Exception):
+    """Raised when an evaluation is cancelled before it finishes."""
+
+class EvaluationBudgetExceeded(OverflowError):
+    """Raised when an evaluation runs out of time or steps. Like other overflows it is shown as MATH_ERROR."""
+
+class EvaluationBudget:
+    """Limits how long an evaluation may run and lets another thread cancel it."""
+    def __init__(self, seconds: float = None, steps: int = None) -> None:
+        """Initialises a budget of seconds from now and steps instructions. None means no limit."""
+        self.steps = steps
+        self.cancelled = False
+        self._deadline = None if seconds is None else time.monotonic() + seconds
+        self._steps_taken = 0
+
+    def cancel(self) -> None:
+        """Make the evaluation using this budget raise EvaluationCancelled at its next step."""
+        self.cancelled = True
+
+    def check(self) -> None:
+        """Count one step, raising EvaluationCancelled or EvaluationBudgetExceeded if evaluation must stop."""
+        if self.cancelled:
+            raise EvaluationCancelled
+        self._steps_taken += 1
+        if self.steps is not None and self._steps_taken > self.steps:
+            raise EvaluationBudgetExceeded("Evaluation took too many steps")
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise EvaluationBudgetExceeded("Evaluation took too long")
+
+class CompiledExpression:
+    """An expression that has been parsed once and can be evaluated many times."""
+    def __init__(self, expression: str, normalised_expression: str, tree,
+                 processor: "CalculationProcessor", optimise_tree: bool = True,
+                 budget: EvaluationBudget = None) -> None:
+        """Initialises a compiled expression from its parsed tree. The normalised expression is the
+        expression with whitespace removed and keyboard symbols replaced by their button symbols. Unless
+        optimise_tree is False, constant subtrees are folded and repeated subtrees evaluated once, checking
+        budget before each fold."""
+        self.expression = expression
+        self.normalised_expression = normalised_expression
+        self.tree = tree
+        self._processor = processor
+        self._optimise_tree = optimise_tree
+        self._function = None
+        self._function_angle_mode = None
+        self._build(budget)
+        self.variables = frozenset(argument for instruction, argument in self.program
+                                   if instruction == LOAD_VARIABLE)
+
+    @property
+    def folded(self) -> int:
+        """The number of operations replaced by their result when compiling."""
+        return self.stats.folded if self.stats is not None else 0
+
+    def _build(self, budget: EvaluationBudget = None) -> None:
+        """Optimise the tree and build the program for the processor's current angle mode, which folded
+        trigonometric functions depend on."""
+        processor = self._processor
+        if self._optimise_tree:
+            self.optimised_tree, self.program, self.stats = optimise(self.tree, processor, budget=budget)
+            self._temporaries = self.stats.shared
+        else:
+            self.optimised_tree, self.stats = self.tree, None
+            self.program = compile_tree(self.tree)
+            self._temporaries = 0
+        self._angle_mode = processor._angle_mode
+
+        unary_operations = processor._unary_operations
+        binary_operations = processor._binary_operations
+        self._steps = []
+        for instruction, argument in self.program:
+            if instruction == APPLY_UNARY:
+                argument = unary_operations[argument]
+            elif instruction == APPLY_BINARY:
+                argument = binary_operations[argument]
+            self._steps.append((instruction, argument))
+
+    def _update(self) -> None:
+        """Rebuild the program if the angle mode has changed since it was built."""
+        if self._angle_mode != self._processor._angle_mode:
+            self._build()
+
+    def evaluate(self, variables: dict = None, budget: EvaluationBudget = None):
+        """Evaluate the expression with the given variable values and return the resulting number. A budget
+        is checked before every instruction. An infinite or NaN result raises OverflowError."""
+        if self.variables:
+            if variables is None or not self.variables.issubset(variables):
+                missing = sorted(self.variables.difference(variables or ()))
+                raise ExpressionSyntaxError(f"Undefined variable {missing[0]}")
+        if self._angle_mode != self._processor._angle_mode:
+            self._build(budget)
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        temporaries = [None] * self._temporaries
+        check = None if budget is None else budget.check
+        for instruction, argument in self._steps:
+            if check is not None:
+                check()
+            if instruction == PUSH_NUMBER:
+                push(argument)
+            elif instruction == APPLY_BINARY:
+                right = pop()
+                stack[-1] = argument(stack[-1], right)
+            elif instruction == APPLY_UNARY:
+                stack[-1] = argument(stack[-1])
+            elif instruction == LOAD_VARIABLE:
+                push(variables[argument])
+            elif instruction == STORE_TEMPORARY:
+                temporaries[argument] = stack[-1]
+            else:
+                push(temporaries[argument])
+        return finite_result(stack[0])
+
+    def __call__(self, **variables):
+        """Evaluate the expression with the given variable values, e.g. f(x=2, y=30) for
+        processor.compile("3×x^2+sin(y)"). Ans and M default to the processor's values. The first call
+        generates a Python function from the optimised tree, which later calls reuse. If it can not be
+        generated, the instruction list is evaluated instead."""
+        processor = self._processor
+        function = self._function
+        if function is None or self._function_angle_mode != processor._angle_mode:
+            function = self._generate_function()
+        try:
+            return finite_result(function(variables, processor._variables))
+        except KeyError as error:
+            raise ExpressionSyntaxError(f"Undefined variable {error.args[0]}") from None
+
+    def _generate_function(self):
+        """Generate and keep the function used by __call__."""
+        from CalculatorCodegen import generate_function
+
+        processor = self._processor
+        self._update()
+        try:
+            function = generate_function(self.optimised_tree, processor).function
+        except (SyntaxError, RecursionError, MemoryError):
+            function = lambda variables, state: self.evaluate({**state, **variables})
+        self._function = function
+        self._function_angle_mode = processor._angle_mode
+        return function
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.expression!r})"
 
 class CalculationProcessor:
     """Handles calculating expressions given by the UI."""
-    def process_input(self, expression: str) -> str:
-        """Process the operations in the given string."""
-        bracket_split = self._split_brackets(expression)
-        self._evaluate_brackets(bracket_split)
-        expression = BLANK.join(bracket_split)
-        
-        expression = self._evaluate_operations(expression)
-        
-        basic_operator_split = self._split_operators(expression)
-        self._evaluate_basic_operators(basic_operator_split, (MULTIPLY, DIVIDE))
-        self._evaluate_basic_operators(basic_operator_split, (PLUS, MINUS))
-        expression = BLANK.join(basic_operator_split)
-        
-        return expression
-
-    def _evaluate_brackets(self, expression: list) -> list:
-        """Find all brackets and evaluate expression within appropriately."""
-        while LEFT_BRACKET in expression:
-            for index in range(len(expression)):
-                element = expression[index]
-                if element is LEFT_BRACKET:
-                    left_bracket_position = index
-                elif element is RIGHT_BRACKET:
-                    element_for_evaluation = expression[left_bracket_position + 1]
-                    break
-            
-            for count in range(3):
-                expression.pop(left_bracket_position)
-            evaluated_expression = self.process_input(element_for_evaluation)
-            expression.insert(left_bracket_position, evaluated_expression)
-        
-        return expression
-
-    def _evaluate_operations(self, expression: str) -> str:
-        """Find operations such as sin, x^2 and log. Evaluate all operations and return partially evaluated expresson."""
-        return expression
-
-    def _split_operators(self, expression: str) -> list:
-        """Split an expression into a list containing elements seperated by operators. E.g. _split_basic_operators("302.2+3×6")
-        returns ['302.2', '+', '3', '×', '6']"""
-        operation_splits = []
-        element = BLANK
-        for index in range(len(expression)):
-            character = expression[index]
-            if index == 0 or character in NUMBER_PARTS:
-                element += character
-                
-                last_index = len(expression) - 1
-                if index == last_index:
-                    operation_splits.append(element)
-                    
-            else:
-                operation_splits.append(element)
-                operation_splits.append(character)
-                element = BLANK
-                
-        return operation_splits
-
-    def _split_brackets(self, expression: str) -> list:
-        """Split expression into a list seperated by brackets that are not attached to a function.
-        E.g. _split_brackets("(32+4)×(3+sin(30))") returns ['(', '32+4', ')', '×', '(', '3+sin(30)', ')']"""
-        # Might be able to simplify
-        bracket_splits = []
-        function_right_bracket = False
-        element = BLANK
-        for index in range(len(expression)):
-            character = expression[index]
-            if character not in BRACKETS:
-                element += character
-                if index == len(expression) -1:
-                    bracket_splits.append(element)
-            elif character is LEFT_BRACKET:
-                if element is BLANK:
-                    bracket_splits.append(character)
-                elif element[-1].isalpha() and element[-1].islower():
-                    element += character
-                    function_right_bracket = True
-                else:
-                    bracket_splits.append(element)
-                    bracket_splits.append(character)
-                    element = BLANK
-            elif character is RIGHT_BRACKET:
-                if function_right_bracket == False:
-                    bracket_splits.append(element)
-                    bracket_splits.append(character)
-                    element = BLANK
-                else:
-                    element += character
-                    function_right_bracket = False            
-                
-        return bracket_splits
-
-    def _split_advanced_operators(self, expression: str) -> list:
-        """Split an expression string into advanced operations followed by the number to be operated on. E.g '3+4×sin(30)+|-2|' returns
-        ['3+4×', 'sin', '30', ||, -2]."""
-        ###
-                    
-    def _evaluate_basic_operators(self, expression: list, operator_pair: tuple) -> list:
-        """Find all operators given in operator pair and evaluate them. The operator pair can contain multiplication and division, or addition and subtraction.
-        Return partially evaluated expression."""
-        basic_operations = {MULTIPLY:lambda x, y: x * y, DIVIDE:lambda x, y: x / y, \
-                            PLUS:lambda x, y: x + y, MINUS:lambda x, y: x - y}
-        operation1, operation2 = operator_pair 
-        
-        while operation1 in expression or operation2 in expression:
-            try: operation1_position = expression.index(operation1)
-            except: operation1_position = len(expression)
-            try: operation2_position = expression.index(operation2)
-            except: operation2_position = len(expression)
-                
-            leftmost_operation_position = min(operation1_position, operation2_position)
-            operation_undertaken = expression[leftmost_operation_position]
-            left_number = float(expression[leftmost_operation_position - 1])
-            right_number = float(expression[leftmost_operation_position + 1])
-
-            evaluated_number = basic_operations[operation_undertaken](left_number, right_number)
-
-            for count in range(3):
-                expression.pop(leftmost_operation_position - 1)
-            expression.insert(leftmost_operation_position - 1, str(evaluated_number))
- 
-        return expression
-
-    def _evaluate_factorial(self, expression: str) -> str:
-        """With a given string evaluate and return its factorial."""
-        raise NotImplementedError
+    def __init__(self, cache_size: int = 0, factorial_limit: int = EXACT_FACTORIAL_LIMIT,
+                 persistent_cache: PersistentResultCache = None, number_mode: str = FLOAT_MODE,
+                 decimal_precision: int = DECIMAL_PRECISION) -> None:
+        """Initialises a new processor in degree mode. A positive cache_size enables memoization of up to
+        that many compiled expressions and results. Exact factorials are calculated up to factorial_limit.
+        Results that are slow to evaluate are also kept in persistent_cache if one is given. Numbers are
+        handled by the backend for number_mode, with decimal_precision significant digits in DECIMAL_MODE.
+        Setting profiler to a CalculatorProfile.StageProfiler records the time spent in each stage."""
+        self._angle_mode = DEGREES
+        self._decimal_precision = decimal_precision
+        self.persistent_cache = persistent_cache
+        self.profiler = None
+        self.factorial_limit = factorial_limit
+        self._variables = {ANSWER: 0, MEMORY: 0}
+        if cache_size:
+            self._compiled_cache = ResultCache(cache_size)
+            self._result_cache = ResultCache(cache_size)
+        else:
+            self._compiled_cache = None
+            self._result_cache = None
+        self._set_backend(make_backend(number_mode, decimal_precision))
+
+    @property
+    def angle_mode(self) -> str:
+        """The unit used by trigonometric functions, either DEGREES or RADIANS."""
+        return self._angle_mode
+
+    @angle_mode.setter
+    def angle_mode(self, angle_mode: str) -> None:
+        if angle_mode not in (DEGREES, RADIANS):
+            raise ValueError(f"Unknown angle mode {angle_mode!r}")
+        self._angle_mode = angle_mode
+
+    @property
+    def number_mode(self) -> str:
+        """How numbers are represented, one of NUMBER_MODES. FLOAT_MODE is the fastest, DECIMAL_MODE rounds to
+        decimal_precision significant digits and FRACTION_MODE keeps rational results exact. Changing the mode
+        converts Ans and M to the new mode."""
+        return self._backend.mode
+
+    @number_mode.setter
+    def number_mode(self, number_mode: str) -> None:
+        self._set_backend(make_backend(number_mode, self._decimal_precision))
+
+    @property
+    def decimal_precision(self) -> int:
+        """The number of significant digits kept in DECIMAL_MODE."""
+        return self._decimal_precision
+
+    @decimal_precision.setter
+    def decimal_precision(self, decimal_precision: int) -> None:
+        backend = make_backend(self.number_mode, decimal_precision)
+        self._decimal_precision = decimal_precision
+        self._set_backend(backend)
+
+    def process_input(self, expression: str, remember_answer: bool = True,
+                      budget: EvaluationBudget = None, add_to_memory: bool = False) -> str:
+        """Process the operations in the given string and return the result to display. The result is
+        kept as Ans unless remember_answer is False, and added to M if add_to_memory is True. Running out of
+        budget gives MATH_ERROR. If the budget is cancelled, even after the last instruction, Ans and M are
+        left unchanged and EvaluationCancelled is raised."""
+        if not expression.strip():
+            return BLANK
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter_ns()
+        try:
+            value = self.evaluate(expression, budget)
+            if add_to_memory:
+                memory = self._variables[MEMORY] + value
+        except ExpressionSyntaxError:
+            result = SYNTAX_ERROR
+        except MATH_EXCEPTIONS:
+            result = MATH_ERROR
+        else:
+            if budget is not None and budget.cancelled:
+                raise EvaluationCancelled
+            if remember_answer:
+                self._variables[ANSWER] = value
+            if add_to_memory:
+                self._variables[MEMORY] = memory
+            if profiler is None:
+                return self.format_result(value)
+            formatting = time.perf_counter_ns()
+            result = self.format_result(value)
+            profiler.record_time(FORMAT_STAGE, time.perf_counter_ns() - formatting)
+
+        if profiler is not None:
+            profiler.record_time(PROCESS_INPUT_STAGE, time.perf_counter_ns() - start)
+        return result
+
+    def memory_add(self, expression: str, budget: EvaluationBudget = None) -> str:
+        """Process the given string like process_input and add the result to the M memory register."""
+        return self.process_input(expression, budget=budget, add_to_memory=True)
+
+    def format_answer(self, fraction: bool = None) -> str:
+        """Format Ans for display again without re-evaluating it, as a fraction if fraction is True or as a
+        decimal if it is False. Used to switch between standard and decimal display."""
+        return self.format_result(self._variables[ANSWER], fraction=fraction)
+
+    def compile(self, expression: str, budget: EvaluationBudget = None) -> CompiledExpression:
+        """Parse the given string once and return a CompiledExpression that can be evaluated repeatedly,
+        e.g. f = compile("3×x^2+sin(y)") and then f(x=2, y=30). A budget limits constant folding."""
+        compiled_cache = self._compiled_cache
+        if compiled_cache is not None:
+            compiled = compiled_cache.get(expression)
+            if compiled is not None:
+                return compiled
+        return self._compile(expression, None, budget)
+
+    def _compile(self, expression: str, tokens: list, budget: EvaluationBudget) -> CompiledExpression:
+        """Compile an expression from its tokens, or tokenize it if tokens is None, and keep it in the
+        compiled expression cache."""
+        compiled_cache = self._compiled_cache
+        if self.profiler is None:
+            if tokens is None:
+                tokens = tokenize(expression)
+            normalised_expression = BLANK.join([token.text for token in tokens])
+            tree = Parser(tokens, self._make_number).parse()
+            compiled = CompiledExpression(expression, normalised_expression, tree, self, budget=budget)
+        else:
+            compiled = self._compile_profiled(expression, budget)
+        if compiled_cache is not None:
+            compiled_cache.put(expression, compiled)
+        return compiled
+
+    def evaluate(self, expression: str, budget: EvaluationBudget = None):
+        """Evaluate the given string and return the resulting number. Numbers stay as ints for as long as
+        results are exact. Raises ExpressionSyntaxError or one of MATH_EXCEPTIONS when the expression can
+        not be evaluated, and EvaluationCancelled if the budget is cancelled. Cached results are looked up
+        by the expression's tokens before it is compiled, as constant folding can be the slow part."""
+        result_cache = self._result_cache
+        persistent_cache = self.persistent_cache
+        if result_cache is None and persistent_cache is None and self.profiler is None:
+            return self.compile(expression, budget).evaluate(self._variables, budget)
+
+        compiled_cache = self._compiled_cache
+        compiled = compiled_cache.get(expression) if compiled_cache is not None else None
+        if compiled is None:
+            tokens = tokenize(expression)
+            normalised_expression = BLANK.join([token.text for token in tokens])
+            names = {token.text for token in tokens if token.kind is NAME_TOKEN and token.text not in FUNCTIONS}
+            key = self._cache_key(normalised_expression, names)
+        else:
+            key = self._cache_key(compiled.normalised_expression, compiled.variables)
+        if result_cache is not None:
+            value = result_cache.get(key)
+            if value is not None:
+                return value
+        if persistent_cache is not None:
+            value = persistent_cache.get(key)
+            if value is not None:
+                if result_cache is not None:
+                    result_cache.put(key, value)
+                return value
+
+        start = time.perf_counter()
+        if compiled is None:
+            compiled = self._compile(expression, tokens, budget)
+        value = self._evaluate_compiled(compiled, budget)
+        if persistent_cache is not None and time.perf_counter() - start >= persistent_cache.min_seconds:
+            persistent_cache.put(key, value)
+        if result_cache is not None:
+            result_cache.put(key, value)
+        return value
+
+    def _evaluate_compiled(self, compiled: CompiledExpression, budget: EvaluationBudget):
+        """Evaluate a compiled expression with the current variables, timing it if profiling."""
+        profiler = self.profiler
+        if profiler is None:
+            return compiled.evaluate(self._variables, budget)
+        start = time.perf_counter_ns()
+        try:
+            return compiled.evaluate(self._variables, budget)
+        finally:
+            profiler.record_time(EVALUATE_STAGE, time.perf_counter_ns() - start)
+
+    def _compile_profiled(self, expression: str, budget: EvaluationBudget = None) -> CompiledExpression:
+        """Compile an expression like compile, recording the time of each stage, the nesting depth, the
+        program length and the number of nodes eliminated by the optimiser."""
+        from CalculatorProfile import nesting_depth
+
+        profiler = self.profiler
+        perf_counter_ns = time.perf_counter_ns
+        start = perf_counter_ns()
+        tokens = tokenize(expression)
+        normalised_expression = BLANK.join([token.text for token in tokens])
+        profiler.record_time(TOKENIZE_STAGE, perf_counter_ns() - start)
+        profiler.record_measure(NESTING_DEPTH, nesting_depth(tokens))
+
+        start = perf_counter_ns()
+        try:
+            tree = Parser(tokens, self._make_number).parse()
+        finally:
+            parsed = perf_counter_ns()
+            profiler.record_time(PARSE_STAGE, parsed - start)
+
+        compiled = CompiledExpression(expression, normalised_expression, tree, self, budget=budget)
+        profiler.record_time(COMPILE_STAGE, perf_counter_ns() - parsed)
+        profiler.record_measure(PROGRAM_LENGTH, len(compiled.program))
+        if compiled.stats is not None:
+            profiler.record_measure(ELIMINATED_NODES, compiled.stats.eliminated)
+        return compiled
+
+    def compile_array(self, expression: str):
+        """Compile the given string once for element-wise evaluation over NumPy arrays. E.g.
+        compile_array("x^2+3×x÷2")(x=numpy.arange(10)) returns an ArrayResult. Requires NumPy."""
+        from CalculatorArrays import ArrayExpression
+        return ArrayExpression(self.compile(expression), self)
+
+    def cache_stats(self) -> dict:
+        """Return the result cache hit, miss and eviction counters, or None if caching is disabled."""
+        if self._result_cache is None:
+            return None
+        return self._result_cache.stats()
+
+    def persistent_cache_stats(self) -> dict:
+        """Return the persistent cache counters and stored size, or None if there is no persistent cache."""
+        if self.persistent_cache is None:
+            return None
+        return self.persistent_cache.stats()
+
+    def _cache_key(self, normalised_expression: str, names) -> tuple:
+        """Return the result cache key for an expression using the variables in names. Values of mutable
+        state the expression depends on, such as Ans and M, are part of the key so a change in them is never
+        served stale."""
+        key = [normalised_expression, self._angle_mode, self._backend.key]
+        variables = self._variables
+        for name in sorted(names):
+            value = variables.get(name)
+            key.append((name, type(value), value))
+        return tuple(key)
+
+    def format_result(self, value, exact: bool = False, fraction: bool = None) -> str:
+        """Format a number for the output display. E.g. 7 is shown as '7', 1/3 as '0.3333333333' and
+        1.5e20 as '1.5×10^20'. Ints of more than about 100 digits are shown to DISPLAY_DIGITS significant
+        digits, without converting the whole int to decimal, unless exact is True. Non-integers are shown
+        as fractions such as '1/3' if fraction is True, the default for Fractions, and the fraction fits."""
+        if isinstance(value, int):
+            if exact or value.bit_length() <= EXACT_DISPLAY_BITS:
+                return exact_digits(value)
+            mantissa, exponent = leading_digits(value, DISPLAY_DIGITS)
+            return f"{mantissa}{EXPONENT_SEPARATOR}{exponent}"
+        if type(value) is not float or fraction:
+            return format_number(value, exact, fraction)
+        if exact:
+            return repr(value)
+        if value.is_integer() and abs(value) < 10 ** DISPLAY_DIGITS:
+            return str(int(value))
+
+        mantissa, separator, exponent = f"{value:.{DISPLAY_DIGITS}g}".partition("e")
+        if separator:
+            return f"{mantissa}{EXPONENT_SEPARATOR}{int(exponent)}"
+        return mantissa
+
+    def _set_backend(self, backend) -> None:
+        """Use backend for numbers, converting the variables and rebuilding the operations. Compiled
+        expressions hold numbers and operations of the old backend, so they are discarded."""
+        self._backend = backend
+        self._make_number = backend.number
+        for name, value in self._variables.items():
+            self._variables[name] = backend.convert(value)
+        binary_operations = {PLUS: operator.add, MINUS: operator.sub, MULTIPLY: operator.mul,
+                             DIVIDE: self._evaluate_division, POWER: self._evaluate_power}
+        unary_operations = {MINUS: operator.neg, FACTORIAL: self._evaluate_factorial, ABSOLUTE_VALUE: abs,
+                            SQUARE_ROOT: self._evaluate_square_root, LOG: math.log10, LN: math.log,
+                            SIN: self._evaluate_sine, COS: self._evaluate_cosine, TAN: self._evaluate_tangent}
+        self._binary_operations, self._unary_operations = backend.operations(binary_operations, unary_operations)
+        if self._compiled_cache is not None:
+            self._compiled_cache.clear()
+
+    def _evaluate_division(self, dividend, divisor):
+        """Divide two numbers, keeping the result as an int when both are ints that divide exactly."""
+        if type(dividend) is int and type(divisor) is int and dividend % divisor == 0:
+            return dividend // divisor
+        return self._backend.divide(dividend, divisor)
+
+    def _evaluate_power(self, base, exponent):
+        """Raise base to exponent. Whole number powers of ints are exact unless the result would be huge."""
+        if type(base) is int and type(exponent) is int and exponent >= 0:
+            if abs(base) <= 1 or exponent * base.bit_length() <= MAX_EXACT_POWER_BITS:
+                return base ** exponent
+        return self._backend.power(base, exponent)
+
+    def _evaluate_square_root(self, value):
+        """Return the square root of a number, exactly if it is an int perfect square."""
+        if type(value) is int and value >= 0:
+            root = math.isqrt(value)
+            if root * root == value:
+                return root
+        return self._backend.square_root(value)
+
+    def _evaluate_sine(self, angle: float) -> float:
+        """Return the sine of an angle in the current angle mode."""
+        if self._angle_mode == DEGREES:
+            return round(math.sin(math.radians(angle)), TRIGONOMETRY_DIGITS)
+        return math.sin(angle)
+
+    def _evaluate_cosine(self, angle: float) -> float:
+        """Return the cosine of an angle in the current angle mode."""
+        if self._angle_mode == DEGREES:
+            return round(math.cos(math.radians(angle)), TRIGONOMETRY_DIGITS)
+        return math.cos(angle)
+
+    def _evaluate_tangent(self, angle: float) -> float:
+        """Return the tangent of an angle in the current angle mode. Degree angles such as 90 where the
+        tangent is undefined raise ZeroDivisionError."""
+        if self._angle_mode == DEGREES:
+            return self._evaluate_sine(angle) / self._evaluate_cosine(angle)
+        return math.tan(angle)
+
+    def _evaluate_factorial(self, value):
+        """With a given number evaluate and return its factorial. The factorial of a whole number is exact up
+        to factorial_limit. A float only needs display precision, so the gamma function is used instead, unless
+        the result is too large for a float, e.g. 1000.0!, when it is calculated exactly like 1000!. Above
+        factorial_limit only display precision is kept, as a Decimal from approximate_factorial."""
+        if type(value) is not float or value > FLOAT_FACTORIAL_LIMIT:
+            if value < 0 or value % 1:
+                raise ValueError("Factorial is only defined for non-negative integers")
+            if value > self.factorial_limit:
+                return approximate_factorial(int(value))
+            return exact_factorial(int(value))
+        if value < 0 or not value.is_integer():
+            raise ValueError("Factorial is only defined for non-negative integers")
+        return math.gamma(value + 1)
 
 if __name__ == "__main__":
     print(NOT_STANDALONE)
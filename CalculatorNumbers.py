@@ -0,0 +1,344 @@
+"""Number helpers for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorCache import ResultCache
+import math
+import sys
+import threading
+
+FACTORIAL_CACHE_SIZE = 16
+FACTORIAL_EXTEND_LIMIT = 256
+LEADING_DIGITS_BITS = 128
+# A fraction whose numerator and denominator have more bits than this has too many digits to fit on the
+# display, so its text is never built.
+FRACTION_DISPLAY_BITS = (DISPLAY_DIGITS + 2) * 4
+# Bernoulli terms of Stirling's series for ln(n!) - (n ln n - n + ln(2πn)/2), as (numerator, denominator,
+# power of n). Later terms are below 1e-17 of the result for n over 20.
+STIRLING_TERMS = ((1, 12, 1), (-1, 360, 3), (1, 1260, 5), (-1, 1680, 7), (1, 1188, 9))
+# ArithmeticError covers ZeroDivisionError, OverflowError and the errors raised by decimal contexts. Combining
+# an approximate factorial, a Decimal, with a float or Fraction raises TypeError.
+MATH_EXCEPTIONS = (ArithmeticError, ValueError, TypeError)
+
+_factorials = ResultCache(FACTORIAL_CACHE_SIZE)
+_factorials_lock = threading.Lock()
+
+def exact_factorial(n: int) -> int:
+    """Return n! exactly. Recent results are cached, and a result close above a cached one is found by
+    multiplying up from it. Otherwise math.factorial is used, which multiplies the odd parts of the
+    factorial with binary splitting in C."""
+    with _factorials_lock:
+        result = _factorials.get(n)
+        if result is not None:
+            return result
+        closest = max((cached for cached in _factorials if cached < n), default=None)
+        if closest is not None and n - closest <= FACTORIAL_EXTEND_LIMIT:
+            result = _factorials.get(closest)
+
+    if result is not None:
+        for factor in range(closest + 1, n + 1):
+            result *= factor
+    else:
+        result = math.factorial(n)
+    with _factorials_lock:
+        _factorials.put(n, result)
+    return result
+
+def finite_result(value):
+    """Return the result of an evaluation, raising OverflowError if it is an infinite or NaN float, which
+    an intermediate result overflowing can give, e.g. 10^308×10.0."""
+    if type(value) is float and not math.isfinite(value):
+        raise OverflowError("Result is not a finite number")
+    return value
+
+def approximate_factorial(n: int):
+    """Return n! as a Decimal of display precision, from Stirling's series for its logarithm, without
+    calculating it exactly. Raises OverflowError if it is too large for the default decimal context, in
+    which any arithmetic on it would overflow anyway."""
+    from decimal import Context, Decimal
+
+    limit = Context()
+    if n.bit_length() > limit.Emax.bit_length():
+        raise OverflowError("Factorial result is too large")
+    context = Context(prec=DISPLAY_DIGITS + 2 * len(str(n)) + 10)
+    x = Decimal(n)
+    logarithm = context.subtract(context.multiply(x, context.ln(x)), x)
+    logarithm += context.ln(context.multiply(2 * Decimal(math.pi), x)) / 2
+    for numerator, denominator, power in STIRLING_TERMS:
+        logarithm += context.divide(numerator, context.multiply(denominator, context.power(x, power)))
+    logarithm = context.divide(logarithm, context.ln(10))
+    exponent = int(logarithm)
+    if exponent > limit.Emax:
+        raise OverflowError("Factorial result is too large")
+    mantissa = context.exp(context.multiply(logarithm - exponent, context.ln(10)))
+    return Context(prec=DISPLAY_DIGITS + 2).create_decimal(mantissa).scaleb(exponent, limit)
+
+def leading_digits(value: int, digits: int) -> tuple:
+    """Return the first digits significant digits of a non-zero int as a mantissa string and its power of
+    ten, without converting the whole int to decimal. E.g. leading_digits(123456, 3) returns
+    ('1.23', 5)."""
+    from decimal import Decimal, localcontext, ROUND_FLOOR
+
+    sign = MINUS if value < 0 else BLANK
+    value = abs(value)
+    shift = max(value.bit_length() - LEADING_DIGITS_BITS, 0)
+    with localcontext() as context:
+        context.prec = digits + 30
+        logarithm = Decimal(value >> shift).log10() + shift * Decimal(2).log10()
+        exponent = int(logarithm.to_integral_value(ROUND_FLOOR))
+        mantissa = Decimal(10) ** (logarithm - exponent)
+        mantissa = round(mantissa, digits - 1)
+    if mantissa >= 10:
+        mantissa /= 10
+        exponent += 1
+    text = f"{mantissa:f}"
+    if DOT in text:
+        text = text.rstrip("0").rstrip(DOT)
+    return sign + text, exponent
+
+def exact_digits(value: int) -> str:
+    """Return all the decimal digits of an int, however long it is."""
+    limit = getattr(sys, "get_int_max_str_digits", lambda: 0)()
+    if limit == 0 or value.bit_length() < limit * 3:
+        return str(value)
+    sys.set_int_max_str_digits(0)
+    try:
+        return str(value)
+    finally:
+        sys.set_int_max_str_digits(limit)
+
+def format_number(value, exact: bool = False, fraction: bool = None) -> str:
+    """Format a float, Decimal or Fraction for display like CalculationProcessor.format_result. If fraction
+    is True, which is the default for a Fraction, the value is shown as 'numerator/denominator' when that
+    fits on the display or exact is True. Otherwise it is shown as a decimal, with a ×10^ exponent if it
+    is large or small. Fractions of any size are shown without converting them to floats."""
+    from decimal import Decimal, localcontext
+    from fractions import Fraction
+
+    if fraction is None:
+        fraction = type(value) is Fraction
+    if type(value) is float:
+        finite = math.isfinite(value)
+    else:
+        finite = type(value) is Fraction or value.is_finite()
+    if fraction and finite:
+        ratio = Fraction(repr(value)) if type(value) is float else Fraction(value)
+        numerator, denominator = ratio.numerator, ratio.denominator
+        if denominator != 1:
+            if exact:
+                return f"{exact_digits(numerator)}{KEYBOARD_DIVIDE}{exact_digits(denominator)}"
+            if numerator.bit_length() + denominator.bit_length() <= FRACTION_DISPLAY_BITS:
+                text = f"{numerator}{KEYBOARD_DIVIDE}{denominator}"
+                if len(text.lstrip(MINUS)) <= DISPLAY_DIGITS + 1:
+                    return text
+        elif exact:
+            return exact_digits(numerator)
+
+    if type(value) is float:
+        value = Decimal(repr(value))
+    elif type(value) is Fraction:
+        if exact:
+            return f"{exact_digits(value.numerator)}{KEYBOARD_DIVIDE}{exact_digits(value.denominator)}"
+        with localcontext() as context:
+            context.prec = DISPLAY_DIGITS + 5
+            value = Decimal(value.numerator) / value.denominator
+    if exact:
+        return str(value)
+    if value.is_finite() and value == value.to_integral_value() and abs(value) < 10 ** DISPLAY_DIGITS:
+        return str(int(value))
+
+    mantissa, separator, exponent = f"{value:.{DISPLAY_DIGITS}g}".partition("e")
+    if DOT in mantissa:
+        mantissa = mantissa.rstrip("0").rstrip(DOT)
+    if separator:
+        return f"{mantissa}{EXPONENT_SEPARATOR}{int(exponent)}"
+    return mantissa
+
+class FloatBackend:
+    """Numbers are ints for as long as results are exact and floats otherwise. The fastest mode."""
+    mode = FLOAT_MODE
+
+    def __init__(self) -> None:
+        """Initialises the backend."""
+        self.key = self.mode
+
+    def number(self, text: str):
+        """Convert number text from an expression into an int, or a float if it has a decimal point."""
+        if DOT in text:
+            return float(text)
+        return int(text)
+
+    def convert(self, value):
+        """Convert a number from another backend into one this backend works with. Fractions too large for a
+        float become the nearest int, and Decimals too large for one, such as approximate factorials, stay
+        as they are."""
+        if type(value) is int or type(value) is float:
+            return value
+        try:
+            result = float(value)
+        except OverflowError:
+            return round(value)
+        return value if math.isinf(result) else result
+
+    def divide(self, dividend, divisor):
+        """Divide two numbers that are not ints dividing exactly."""
+        return dividend / divisor
+
+    def power(self, base, exponent):
+        """Raise base to exponent when the result is not an exact int."""
+        return math.pow(base, exponent)
+
+    def square_root(self, value):
+        """Return the square root of a number that is not an int perfect square."""
+        return math.sqrt(value)
+
+    def operations(self, binary_operations: dict, unary_operations: dict) -> tuple:
+        """Return the processor's binary and unary operations adapted to this backend."""
+        return binary_operations, unary_operations
+
+class FractionBackend(FloatBackend):
+    """Numbers are ints and Fractions, so arithmetic on rationals is exact. Irrational results such as
+    square roots and logarithms are floats, as are results combining a float with a Fraction."""
+    mode = FRACTION_MODE
+
+    def __init__(self) -> None:
+        """Initialises the backend."""
+        from fractions import Fraction
+        super().__init__()
+        self._fraction = Fraction
+
+    def _normalise(self, value):
+        """Turn a whole number Fraction into an int."""
+        if type(value) is self._fraction and value.denominator == 1:
+            return value.numerator
+        return value
+
+    def number(self, text: str):
+        """Convert number text from an expression into an int or a Fraction. E.g. 0.1 is exactly 1/10."""
+        if DOT in text:
+            return self._normalise(self._fraction(text))
+        return int(text)
+
+    def convert(self, value):
+        """Convert a number from another backend into one this backend works with. Decimals are exact
+        Fractions, unless they are too large for a float like approximate factorials, and floats stay as
+        they are."""
+        if type(value) is int or type(value) is float:
+            return value
+        if type(value) is not self._fraction and math.isinf(float(value)):
+            return value
+        return self._normalise(self._fraction(value))
+
+    def divide(self, dividend, divisor):
+        """Divide two numbers that are not ints dividing exactly."""
+        if type(dividend) is int and type(divisor) is int:
+            return self._fraction(dividend, divisor)
+        return self._normalise(dividend / divisor)
+
+    def power(self, base, exponent):
+        """Raise base to exponent. Whole number powers of Fractions and negative powers of ints are exact
+        unless the result would be huge."""
+        if type(exponent) is int and (type(base) is int or type(base) is self._fraction):
+            base = self._fraction(base)
+            size = max(base.numerator.bit_length(), base.denominator.bit_length())
+            if abs(exponent) * size <= MAX_EXACT_POWER_BITS:
+                return self._normalise(base ** exponent)
+        return math.pow(base, exponent)
+
+    def square_root(self, value):
+        """Return the square root of a number, exactly if it is a Fraction of perfect squares."""
+        if type(value) is self._fraction and value > 0:
+            numerator = math.isqrt(value.numerator)
+            denominator = math.isqrt(value.denominator)
+            if numerator * numerator == value.numerator and denominator * denominator == value.denominator:
+                return self._fraction(numerator, denominator)
+        return math.sqrt(value)
+
+class DecimalBackend(FloatBackend):
+    """Numbers are ints and Decimals rounded to a given number of significant digits. Arithmetic is done
+    in a private decimal context, so the precision does not depend on the thread evaluating."""
+    mode = DECIMAL_MODE
+
+    def __init__(self, precision: int = DECIMAL_PRECISION) -> None:
+        """Initialises a backend working to precision significant digits."""
+        import decimal
+        if precision < 1:
+            raise ValueError("Decimal precision must be at least 1")
+        super().__init__()
+        self.precision = precision
+        self.key = f"{self.mode}{precision}"
+        self.context = decimal.Context(prec=precision, traps=[decimal.InvalidOperation, decimal.DivisionByZero,
+                                                              decimal.Overflow])
+        self._decimal = decimal.Decimal
+
+    def number(self, text: str):
+        """Convert number text from an expression into an int, or a Decimal if it has a decimal point."""
+        if DOT in text:
+            return self.context.create_decimal(text)
+        return int(text)
+
+    def convert(self, value):
+        """Convert a number from another backend into one this backend works with. Floats are converted
+        from their shortest representation, so 0.1 becomes Decimal('0.1')."""
+        if type(value) is int:
+            return value
+        if type(value) is float:
+            return self.context.create_decimal(repr(value))
+        if type(value) is self._decimal:
+            return self.context.plus(value)
+        return self.context.divide(value.numerator, value.denominator)
+
+    def divide(self, dividend, divisor):
+        """Divide two numbers that are not ints dividing exactly."""
+        return self.context.divide(dividend, divisor)
+
+    def power(self, base, exponent):
+        """Raise base to exponent when the result is not an exact int. Negative powers of zero raise
+        ZeroDivisionError, as the context would return infinity for them."""
+        if not base and exponent < 0:
+            raise ZeroDivisionError("Zero to a negative power")
+        return self.context.power(base, exponent)
+
+    def square_root(self, value):
+        """Return the square root of a number that is not an int perfect square."""
+        return self.context.sqrt(value)
+
+    def _logarithm(self, function):
+        """Return a logarithm in the decimal context which, like math.log, rejects zero."""
+        def logarithm(value):
+            if value <= 0:
+                raise ValueError("math domain error")
+            return function(value)
+        return logarithm
+
+    def _real(self, function):
+        """Return function with its float result converted to a Decimal."""
+        create_decimal = self.context.create_decimal
+        return lambda value: create_decimal(repr(function(value)))
+
+    def operations(self, binary_operations: dict, unary_operations: dict) -> tuple:
+        """Return the processor's binary and unary operations adapted to this backend. Arithmetic is done
+        in the backend's context and trigonometric results are converted from floats."""
+        context = self.context
+        binary_operations = dict(binary_operations)
+        binary_operations.update({PLUS: context.add, MINUS: context.subtract, MULTIPLY: context.multiply})
+        unary_operations = dict(unary_operations)
+        unary_operations.update({MINUS: context.minus, ABSOLUTE_VALUE: context.abs,
+                                 LOG: self._logarithm(context.log10), LN: self._logarithm(context.ln)})
+        for function in (SIN, COS, TAN):
+            unary_operations[function] = self._real(unary_operations[function])
+        return binary_operations, unary_operations
+
+def make_backend(mode: str, precision: int = DECIMAL_PRECISION) -> FloatBackend:
+    """Return the backend for a number mode. precision is only used by DECIMAL_MODE."""
+    if mode == FLOAT_MODE:
+        return FloatBackend()
+    if mode == FRACTION_MODE:
+        return FractionBackend()
+    if mode == DECIMAL_MODE:
+        return DecimalBackend(precision)
+    raise ValueError(f"Unknown number mode {mode!r}")
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
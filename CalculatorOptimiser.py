@@ -0,0 +1,188 @@
+"""Expression tree optimiser for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorNumbers import MATH_EXCEPTIONS
+from CalculatorParser import BinaryOperation, Number, UnaryOperation, Variable, compile_tree
+
+# Operations whose cost is not bounded by the size of their operands are left for evaluation, where a
+# budget can stop them.
+UNFOLDED_OPERATIONS = (FACTORIAL,)
+# Folded results larger than this are left for evaluation too, so compiling stays cheap and a budget can stop
+# arithmetic on huge numbers.
+MAX_FOLDED_BITS = MAX_EXACT_POWER_BITS
+
+class OptimiserStats:
+    """How much an expression tree was reduced by the optimiser."""
+    __slots__ = ("nodes", "unique", "folded", "shared")
+
+    def __init__(self, nodes: int, unique: int, folded: int, shared: int) -> None:
+        """nodes is the size of the parsed tree and unique the number of distinct nodes left after
+        folding and merging. folded operations were replaced by their result and shared operations are
+        evaluated once although they appear several times."""
+        self.nodes = nodes
+        self.unique = unique
+        self.folded = folded
+        self.shared = shared
+
+    @property
+    def eliminated(self) -> int:
+        """The number of nodes that no longer need evaluating."""
+        return self.nodes - self.unique
+
+    def as_dict(self) -> dict:
+        """Return the stats as a dict."""
+        return {"nodes": self.nodes, "unique": self.unique, "folded": self.folded, "shared": self.shared,
+                "eliminated": self.eliminated}
+
+    def __repr__(self) -> str:
+        return (f"OptimiserStats(nodes={self.nodes}, unique={self.unique}, folded={self.folded}, "
+                f"shared={self.shared})")
+
+def _number_key(value) -> tuple:
+    """Return a key that is equal only for numbers that behave the same. Zeros are compared by their text
+    so 0.0 and -0.0 differ, and Decimals by their text so 1.0 and 1 differ."""
+    value_type = type(value)
+    if value and (value_type is float or value_type is int):
+        return (value_type, value)
+    return (value_type, str(value))
+
+def _small_enough(value) -> bool:
+    """Return whether a folded result is small enough to keep in place of its operation."""
+    value_type = type(value)
+    if value_type is int:
+        return value.bit_length() <= MAX_FOLDED_BITS
+    # Compared by name, so the fractions module is only imported in modes that use it.
+    if value_type.__name__ == "Fraction":
+        return value.numerator.bit_length() + value.denominator.bit_length() <= MAX_FOLDED_BITS
+    return True
+
+def optimise(tree, processor, fold_constants: bool = True, budget=None) -> tuple:
+    """Fold operations on constants and merge identical subtrees, hash-consing them into a directed acyclic
+    graph. E.g. the three copies of (3+sin(30)) in (3+sin(30))×(3+sin(30))÷(3+sin(30)) are folded to 3.5,
+    and the three copies of (x+1) in (x+1)×(x+1)÷(x+1) become one node. Folding uses the processor's
+    operations, so the result depends on its angle and number modes, and operations that raise are
+    left to raise during evaluation, as are results larger than MAX_FOLDED_BITS. A budget, if given, is
+    checked before each fold. Returns the new root, its program as built by compile_tree, with
+    shared operations kept in temporaries, and OptimiserStats. The program is built during the same walk
+    unless an operation is shared."""
+    unary_operations = processor._unary_operations
+    binary_operations = processor._binary_operations
+    # Numbers are keyed by a tuple, variables by their name and operations by a tuple of their operator
+    # and the ids of their interned operands, so the kinds of key never collide.
+    interned = {}
+    check = None if budget is None else budget.check
+    used = set()
+    shared = set()
+    leaves = set()
+    results = []
+    program = []
+    emit = program.append
+    nodes = 0
+    folded = 0
+    operations = 0
+    operands = None
+
+    # Operations are pushed once to visit their operands and again, after None, to combine them.
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        node_type = type(node)
+        if node is not None:
+            nodes += 1
+        if node_type is Number:
+            # Numbers are interned once an operation uses them, so folded intermediate results are not kept.
+            results.append(node)
+            emit((PUSH_NUMBER, node.value))
+            continue
+        if node_type is Variable:
+            results.append(interned.setdefault(node.name, node))
+            emit((LOAD_VARIABLE, node.name))
+            continue
+        if node is not None:
+            if node_type is UnaryOperation:
+                pending += (node, None, node.operand)
+            else:
+                pending += (node, None, node.right, node.left)
+            continue
+
+        node = pending.pop()
+        operator = node.operator
+        if type(node) is UnaryOperation:
+            operand = results.pop()
+            if fold_constants and type(operand) is Number and operator not in UNFOLDED_OPERATIONS:
+                if check is not None:
+                    check()
+                try:
+                    value = unary_operations[operator](operand.value)
+                except MATH_EXCEPTIONS:
+                    pass
+                else:
+                    if _small_enough(value):
+                        folded += 1
+                        results.append(Number(value))
+                        program[-1] = (PUSH_NUMBER, value)
+                        continue
+            if type(operand) is Number:
+                operand = interned.setdefault(_number_key(operand.value), operand)
+            emit((APPLY_UNARY, operator))
+            key = (operator, id(operand))
+            optimised = interned.get(key)
+            if optimised is None:
+                optimised = interned[key] = UnaryOperation(operator, operand)
+                operands = (operand,)
+        else:
+            right = results.pop()
+            left = results.pop()
+            if (fold_constants and type(left) is Number and type(right) is Number
+                    and operator not in UNFOLDED_OPERATIONS):
+                if check is not None:
+                    check()
+                try:
+                    value = binary_operations[operator](left.value, right.value)
+                except MATH_EXCEPTIONS:
+                    pass
+                else:
+                    if _small_enough(value):
+                        folded += 1
+                        results.append(Number(value))
+                        del program[-1]
+                        program[-1] = (PUSH_NUMBER, value)
+                        continue
+            if type(left) is Number:
+                left = interned.setdefault(_number_key(left.value), left)
+            if type(right) is Number:
+                right = interned.setdefault(_number_key(right.value), right)
+            emit((APPLY_BINARY, operator))
+            key = (operator, id(left), id(right))
+            optimised = interned.get(key)
+            if optimised is None:
+                optimised = interned[key] = BinaryOperation(operator, left, right)
+                operands = (left, right)
+        results.append(optimised)
+        if operands is None:
+            continue
+
+        # Count what the new node uses. Folded numbers that nothing uses are not part of the result.
+        operations += 1
+        for operand in operands:
+            operand_type = type(operand)
+            if operand_type is Number or operand_type is Variable:
+                leaves.add(id(operand))
+            elif id(operand) in used:
+                shared.add(id(operand))
+            else:
+                used.add(id(operand))
+        operands = None
+
+    root = results[0]
+    if type(root) is Number or type(root) is Variable:
+        leaves.add(id(root))
+    if shared:
+        # The walk evaluated every copy of a shared operation, so flatten the graph again.
+        program = compile_tree(root, shared)
+    return root, program, OptimiserStats(nodes, operations + len(leaves), folded, len(shared))
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
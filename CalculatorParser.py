@@ -0,0 +1,237 @@
+"""Expression lexer and parser for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from collections import namedtuple
+import re
+
+# Names stop at digits, and a function name is split off the front of a name unless a lower case letter
+# follows it, so sin30, log100 and lnAns read as sin 30, log 100 and ln Ans while cost stays a name.
+_FUNCTION_NAMES = "|".join(sorted(FUNCTIONS, key=len, reverse=True))
+_TOKEN_PATTERN = re.compile(r"\s*(?:(?P<number>\d+\.?\d*|\.\d+)"
+                            rf"|(?P<name>(?:{_FUNCTION_NAMES})(?=(?:{_FUNCTION_NAMES})|(?![a-z_]))|[A-Za-z_]+)"
+                            r"|(?P<symbol>[-+×÷/^√!|()]))")
+_TRAILING_SPACE = re.compile(r"\s*")
+_TOKEN_KINDS = {"number": NUMBER_TOKEN, "name": NAME_TOKEN, "symbol": SYMBOL_TOKEN}
+
+class ExpressionSyntaxError(Exception):
+    """Raised when an expression can not be tokenized or parsed."""
+
+Token = namedtuple("Token", ("kind", "text", "position"))
+Token.__doc__ = """A single lexical element of an expression and where it starts."""
+
+def tokenize(expression: str, start: int = 0) -> list:
+    """Split an expression into tokens in a single pass, starting at the given position. E.g.
+    tokenize("3+sin(30)") returns tokens for '3', '+', 'sin', '(', '30' and ')' followed by an end token."""
+    tokens = []
+    position = start
+    length = len(expression)
+    match_token = _TOKEN_PATTERN.match
+    while True:
+        match = match_token(expression, position)
+        if match is None:
+            break
+        kind = match.lastgroup
+        text = match.group(kind)
+        if text == KEYBOARD_DIVIDE:
+            text = DIVIDE
+        tokens.append(Token(_TOKEN_KINDS[kind], text, match.start(kind)))
+        position = match.end()
+
+    position = _TRAILING_SPACE.match(expression, position).end()
+    if position != length:
+        raise ExpressionSyntaxError(f"Unexpected character {expression[position]!r} at {position}")
+    tokens.append(Token(END_TOKEN, BLANK, length))
+    return tokens
+
+class Number:
+    """A number literal in an expression tree."""
+    __slots__ = ("value",)
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"Number({self.value!r})"
+
+class Variable:
+    """A named value such as Ans in an expression tree."""
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Variable({self.name!r})"
+
+class UnaryOperation:
+    """A function, prefix or postfix operator applied to a single operand."""
+    __slots__ = ("operator", "operand")
+
+    def __init__(self, operator: str, operand) -> None:
+        self.operator = operator
+        self.operand = operand
+
+    def __repr__(self) -> str:
+        return f"UnaryOperation({self.operator!r}, {self.operand!r})"
+
+class BinaryOperation:
+    """An infix operator applied to a left and right operand."""
+    __slots__ = ("operator", "left", "right")
+
+    def __init__(self, operator: str, left, right) -> None:
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+    def __repr__(self) -> str:
+        return f"BinaryOperation({self.operator!r}, {self.left!r}, {self.right!r})"
+
+class Parser:
+    """Precedence climbing parser which turns a list of tokens into an expression tree."""
+    def __init__(self, tokens: list, make_number=float) -> None:
+        """Initialises a parser over tokens produced by tokenize. make_number converts number text to a value."""
+        self._tokens = tokens
+        self._index = 0
+        self._token = tokens[0]
+        self._make_number = make_number
+
+    def parse(self):
+        """Parse all tokens and return the root of the expression tree."""
+        try:
+            tree = self._parse_expression(0)
+        except RecursionError:
+            raise ExpressionSyntaxError("Expression is nested too deeply") from None
+        if self._token.kind is not END_TOKEN:
+            self._unexpected()
+        return tree
+
+    def _advance(self) -> None:
+        """Move on to the next token."""
+        self._index += 1
+        self._token = self._tokens[self._index]
+
+    def _unexpected(self) -> None:
+        """Raise a syntax error for the current token."""
+        token = self._token
+        if token.kind is END_TOKEN:
+            raise ExpressionSyntaxError("Unexpected end of expression")
+        raise ExpressionSyntaxError(f"Unexpected {token.text!r} at {token.position}")
+
+    def _close_bracket(self) -> None:
+        """Consume a right bracket. Brackets left open at the end of the expression are closed implicitly."""
+        token = self._token
+        if token.kind is SYMBOL_TOKEN and token.text == RIGHT_BRACKET:
+            self._advance()
+        elif token.kind is not END_TOKEN:
+            self._unexpected()
+
+    def _parse_expression(self, precedence: int):
+        """Parse operators binding tighter than the given precedence and return the resulting tree."""
+        left = self._parse_prefix()
+        while True:
+            token = self._token
+            if token.kind is not SYMBOL_TOKEN:
+                break
+            operator = token.text
+            if operator == FACTORIAL:
+                self._advance()
+                left = UnaryOperation(FACTORIAL, left)
+                continue
+            binding = BINARY_PRECEDENCES.get(operator)
+            if binding is None or binding <= precedence:
+                break
+            self._advance()
+            if operator in RIGHT_ASSOCIATIVE:
+                binding -= 1
+            left = BinaryOperation(operator, left, self._parse_expression(binding))
+        return left
+
+    def _parse_prefix(self):
+        """Parse a number, variable, bracketed group or prefix operation."""
+        token = self._token
+        kind = token.kind
+        text = token.text
+        if kind is NUMBER_TOKEN:
+            self._advance()
+            return Number(self._make_number(text))
+        elif kind is NAME_TOKEN:
+            self._advance()
+            if text in FUNCTIONS:
+                return UnaryOperation(text, self._parse_argument())
+            return Variable(text)
+        elif kind is SYMBOL_TOKEN:
+            if text == LEFT_BRACKET:
+                self._advance()
+                inner = self._parse_expression(0)
+                self._close_bracket()
+                return inner
+            elif text == MINUS:
+                self._advance()
+                return UnaryOperation(MINUS, self._parse_expression(NEGATION_PRECEDENCE))
+            elif text == SQUARE_ROOT:
+                self._advance()
+                return UnaryOperation(SQUARE_ROOT, self._parse_argument())
+            elif text == ABSOLUTE_BAR:
+                self._advance()
+                inner = self._parse_expression(0)
+                if self._token.text != ABSOLUTE_BAR:
+                    self._unexpected()
+                self._advance()
+                return UnaryOperation(ABSOLUTE_VALUE, inner)
+        self._unexpected()
+
+    def _parse_argument(self):
+        """Parse the argument of a function. E.g. the 30 in sin(30) or sin 30."""
+        token = self._token
+        if token.kind is SYMBOL_TOKEN and token.text == LEFT_BRACKET:
+            self._advance()
+            argument = self._parse_expression(0)
+            self._close_bracket()
+            return argument
+        return self._parse_expression(FUNCTION_PRECEDENCE)
+
+def parse(expression: str, make_number=float):
+    """Tokenize and parse an expression string, returning its expression tree."""
+    return Parser(tokenize(expression), make_number).parse()
+
+def compile_tree(tree, shared: set = None) -> list:
+    """Flatten an expression tree into a postfix list of (instruction, argument) pairs. E.g. the tree for
+    "2+3×4" becomes [(PUSH_NUMBER, 2), (PUSH_NUMBER, 3), (PUSH_NUMBER, 4), (APPLY_BINARY, '×'),
+    (APPLY_BINARY, '+')]. The walk is iterative so very long expressions do not exhaust the stack. Nodes
+    whose ids are in shared are evaluated once and kept with STORE_TEMPORARY, then reused with
+    LOAD_TEMPORARY wherever else they appear."""
+    program = []
+    temporaries = {}
+    pending = [(tree, False)]
+    while pending:
+        node, children_done = pending.pop()
+        if type(node) is Number:
+            program.append((PUSH_NUMBER, node.value))
+            continue
+        elif type(node) is Variable:
+            program.append((LOAD_VARIABLE, node.name))
+            continue
+        elif not children_done:
+            if shared and id(node) in temporaries:
+                program.append((LOAD_TEMPORARY, temporaries[id(node)]))
+                continue
+            pending.append((node, True))
+            if type(node) is UnaryOperation:
+                pending.append((node.operand, False))
+            else:
+                pending.append((node.right, False))
+                pending.append((node.left, False))
+            continue
+        elif type(node) is UnaryOperation:
+            program.append((APPLY_UNARY, node.operator))
+        else:
+            program.append((APPLY_BINARY, node.operator))
+        if shared and id(node) in shared:
+            temporaries[id(node)] = len(temporaries)
+            program.append((STORE_TEMPORARY, temporaries[id(node)]))
+    return program
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
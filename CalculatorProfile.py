@@ -0,0 +1,127 @@
+"""Opt-in instrumentation of the evaluation stages of ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+
+HISTOGRAM_BAR_WIDTH = 40
+
+class Histogram:
+    """Counts non-negative int measurements in power of two buckets, along with their total, minimum and
+    maximum. Bucket b holds values from 2^(b-1) up to but not including 2^b, and bucket 0 holds zero."""
+    __slots__ = ("count", "total", "minimum", "maximum", "buckets")
+
+    def __init__(self) -> None:
+        """Initialises an empty histogram."""
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.buckets = {}
+
+    def add(self, value: int) -> None:
+        """Record one measurement."""
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        bucket = value.bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def mean(self) -> float:
+        """Return the mean of the measurements, or 0.0 if there are none."""
+        return self.total / self.count if self.count else 0.0
+
+    def stats(self) -> dict:
+        """Return the counters and buckets as a dict. Buckets are keyed by their upper bound."""
+        return {"count": self.count, "total": self.total, "mean": self.mean(), "min": self.minimum,
+                "max": self.maximum, "buckets": {1 << bucket: count for bucket, count in sorted(self.buckets.items())}}
+
+class StageProfiler:
+    """Records the wall time and call count of each stage of evaluating expressions, and the nesting depth,
+    program length and nodes eliminated by the optimiser of each expression compiled. Attach one to
+    CalculationProcessor.profiler to enable it. When no profiler is attached the processor only checks for
+    one, so it costs next to nothing."""
+    def __init__(self) -> None:
+        """Initialises a profiler with nothing recorded."""
+        self.timings = {}
+        self.measures = {}
+
+    def record_time(self, stage: str, nanoseconds: int) -> None:
+        """Record that one call of stage took nanoseconds."""
+        histogram = self.timings.get(stage)
+        if histogram is None:
+            histogram = self.timings[stage] = Histogram()
+        histogram.add(nanoseconds)
+
+    def record_measure(self, name: str, value: int) -> None:
+        """Record one measurement of a property of an expression, such as its nesting depth."""
+        histogram = self.measures.get(name)
+        if histogram is None:
+            histogram = self.measures[name] = Histogram()
+        histogram.add(value)
+
+    def reset(self) -> None:
+        """Discard everything recorded."""
+        self.timings.clear()
+        self.measures.clear()
+
+    def stats(self) -> dict:
+        """Return the timing histograms, in nanoseconds, and measure histograms as dicts."""
+        return {"timings": {stage: histogram.stats() for stage, histogram in self.timings.items()},
+                "measures": {name: histogram.stats() for name, histogram in self.measures.items()}}
+
+    def summary(self) -> str:
+        """Return a table of the calls and time spent in each stage followed by a histogram of each."""
+        lines = [f"{'stage':<16}{'calls':>10}{'total ms':>12}{'mean us':>12}{'max us':>12}"]
+        for stage, histogram in self.timings.items():
+            lines.append(f"{stage:<16}{histogram.count:>10}{histogram.total / 1e6:>12.1f}"
+                         f"{histogram.mean() / 1e3:>12.2f}{histogram.maximum / 1e3:>12.1f}")
+        for stage, histogram in self.timings.items():
+            lines.append(BLANK)
+            lines.append(f"{stage} (us)")
+            lines.extend(self._bars(histogram, 1e3))
+        for name, histogram in self.measures.items():
+            lines.append(BLANK)
+            lines.append(f"{name} (mean {histogram.mean():.1f}, max {histogram.maximum})")
+            lines.extend(self._bars(histogram, 1))
+        return "\n".join(lines)
+
+    def _bars(self, histogram: Histogram, scale: float) -> list:
+        """Return one line per bucket with a bar proportional to its count. Bounds are divided by scale."""
+        largest = max(histogram.buckets.values())
+        lines = []
+        for bucket, count in sorted(histogram.buckets.items()):
+            low = (1 << bucket - 1 if bucket else 0) / scale
+            high = (1 << bucket) / scale
+            bar = "#" * max(1, count * HISTOGRAM_BAR_WIDTH // largest)
+            lines.append(f"  {low:>10g} - {high:<10g}{count:>10} {bar}")
+        return lines
+
+def nesting_depth(tokens: list) -> int:
+    """Return the deepest nesting of brackets and absolute value bars in a list of tokens."""
+    depth = 0
+    deepest = 0
+    in_absolute_value = []
+    for token in tokens:
+        text = token.text
+        if text == LEFT_BRACKET:
+            depth += 1
+        elif text == RIGHT_BRACKET:
+            depth -= 1
+        elif text == ABSOLUTE_BAR:
+            # A bar closes the innermost absolute value if it was opened at this depth.
+            if in_absolute_value and in_absolute_value[-1] == depth - 1:
+                in_absolute_value.pop()
+                depth -= 1
+            else:
+                in_absolute_value.append(depth)
+                depth += 1
+        if depth > deepest:
+            deepest = depth
+    return deepest
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
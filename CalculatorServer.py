@@ -0,0 +1,304 @@
+"""Local JSON over HTTP evaluation service for ScientificCalculator.py. Run with
+python ScientificCalculator.py --serve PORT.
+
+POST /evaluate takes {"expression": "1+2"} and returns {"result": "3"}.
+POST /batch takes {"expressions": ["1+2", "3!"]} and returns {"results": ["3", "6"]}.
+GET /stats returns request, latency, throughput and cache counters.
+If a worker process dies, the request gets 503 and the pool is replaced."""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorBatch import DEFAULT_CHUNK_SIZE, _evaluate_chunk, _initialise_worker
+from CalculatorCache import ResultCache
+from collections import deque
+import asyncio
+import json
+import os
+import time
+
+SERVER_HOST = "127.0.0.1"
+SERVER_CACHE_SIZE = 65536
+MAX_CONCURRENT_REQUESTS = 64
+MAX_QUEUED_REQUESTS = 256
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BATCH_EXPRESSIONS = 100000
+SERVER_REQUEST_SECONDS = 10.0
+READ_TIMEOUT_SECONDS = 30.0
+LATENCY_WINDOW = 10000
+SERVER_ENDPOINTS = ("/evaluate", "/batch", "/stats")
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            408: "Request Timeout", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+class HTTPError(Exception):
+    """Raised while handling a request to respond with an error status."""
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+class CalculatorServer:
+    """Evaluates expressions sent over HTTP on a pool of worker processes (or threads), so the event loop
+    only parses requests and writes responses. Results are cached in the server process. At most
+    max_concurrent requests are evaluated at once and at most max_queued more wait for their turn.
+    Requests beyond that are refused with 503 so clients back off instead of piling up."""
+    def __init__(self, workers: int = None, use_threads: bool = False, cache_size: int = SERVER_CACHE_SIZE,
+                 max_concurrent: int = MAX_CONCURRENT_REQUESTS, max_queued: int = MAX_QUEUED_REQUESTS,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, number_mode: str = FLOAT_MODE,
+                 decimal_precision: int = DECIMAL_PRECISION, request_seconds: float = SERVER_REQUEST_SECONDS,
+                 steps: int = EVALUATION_STEP_LIMIT) -> None:
+        """Initialises a server. workers defaults to the number of CPUs. Each expression is evaluated
+        independently, with Ans and M left at zero, so results can be cached by expression alone. The
+        expressions of a request give MATH_ERROR once it has taken request_seconds, or once one of them
+        has taken steps instructions, so no request ties up a worker for long. None means no limit."""
+        self.workers = workers or os.cpu_count() or 1
+        self.use_threads = use_threads
+        self.chunk_size = chunk_size
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.number_mode = number_mode
+        self.decimal_precision = decimal_precision
+        self.request_seconds = request_seconds
+        self.steps = steps
+        self._cache = ResultCache(cache_size) if cache_size else None
+        self._executor = None
+        self._semaphore = None
+        self._waiting = 0
+        self._in_flight = 0
+        self._started = time.monotonic()
+        self._requests = {}
+        self._rejected = 0
+        self._errors = 0
+        self._worker_failures = 0
+        self._expressions = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self, host: str = SERVER_HOST, port: int = 0) -> asyncio.AbstractServer:
+        """Start the worker pool and listen on host and port. Port 0 picks a free port, which can be read
+        from the returned server's sockets. The workers are started before listening, so they do not inherit
+        the sockets of connections."""
+        self._executor = self._create_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, os.getpid) for worker in range(self.workers)))
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._started = time.monotonic()
+        return await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+    async def serve_forever(self, host: str = SERVER_HOST, port: int = 0) -> None:
+        """Start the server and handle requests until cancelled."""
+        server = await self.start(host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def _create_executor(self):
+        """Create the worker pool. Where possible, worker processes are started by a fork server, so workers
+        replacing failed ones do not inherit the sockets of open connections either."""
+        import concurrent.futures
+        import multiprocessing
+
+        initargs = (0, None, self.number_mode, self.decimal_precision)
+        if self.use_threads:
+            return concurrent.futures.ThreadPoolExecutor(self.workers, initializer=_initialise_worker,
+                                                         initargs=initargs)
+        context = None
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        return concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context,
+                                                      initializer=_initialise_worker, initargs=initargs)
+
+    def _replace_executor(self, executor) -> None:
+        """Replace a broken worker pool, unless another request has already replaced it."""
+        if self._executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """Return request counts, latency percentiles of recent requests, throughput and cache counters."""
+        latencies = sorted(self._latencies)
+        uptime = time.monotonic() - self._started
+
+        def percentile(fraction: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] / 1000
+
+        return {"uptime_seconds": uptime, "requests": dict(self._requests), "rejected": self._rejected,
+                "errors": self._errors, "worker_failures": self._worker_failures, "in_flight": self._in_flight, "waiting": self._waiting,
+                "expressions": self._expressions,
+                "expressions_per_second": self._expressions / uptime if uptime else 0.0,
+                "p50_microseconds": percentile(0.5), "p99_microseconds": percentile(0.99),
+                "cache": self._cache.stats() if self._cache is not None else None}
+
+    async def evaluate(self, expressions: list) -> list:
+        """Return the result to display for each expression, evaluating those not cached on the worker
+        pool in chunks of chunk_size. Raises HTTPError with status 503 if a worker dies, after replacing
+        the pool. Results of expressions that ran out of time are not cached."""
+        import concurrent.futures
+
+        cache = self._cache
+        deadline = None if self.request_seconds is None else time.monotonic() + self.request_seconds
+        results = [None] * len(expressions)
+        missing = []
+        for index, expression in enumerate(expressions):
+            result = cache.get(expression) if cache is not None else None
+            if result is None:
+                missing.append(index)
+            else:
+                results[index] = result
+
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        chunks = [missing[start:start + self.chunk_size] for start in range(0, len(missing), self.chunk_size)]
+        try:
+            evaluated = await asyncio.gather(*(loop.run_in_executor(executor, _evaluate_chunk,
+                                                                    [expressions[index] for index in chunk],
+                                                                    deadline, self.steps)
+                                               for chunk in chunks))
+        except concurrent.futures.BrokenExecutor:
+            self._worker_failures += 1
+            self._replace_executor(executor)
+            raise HTTPError(503, "A worker failed, try again")
+        timed_out = deadline is not None and time.monotonic() >= deadline
+        for chunk, (chunk_results, worker, seconds) in zip(chunks, evaluated):
+            for index, result in zip(chunk, chunk_results):
+                results[index] = result
+                if cache is not None and not (timed_out and result == MATH_ERROR):
+                    cache.put(expressions[index], result)
+        self._expressions += len(expressions)
+        return results
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle requests on a connection until the client closes it or asks for it to be closed."""
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    raise HTTPError(408, "Timed out reading the request")
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", BLANK).lower() != "close"
+                start = time.perf_counter_ns()
+                try:
+                    status, response = 200, await self._route(method, path, body)
+                except HTTPError as error:
+                    status, response = error.status, {"error": str(error)}
+                    if status != 503:
+                        self._errors += 1
+                self._latencies.append(time.perf_counter_ns() - start)
+                self._write_response(writer, status, response, keep_alive)
+                await writer.drain()
+        except HTTPError as error:
+            self._errors += 1
+            self._write_response(writer, error.status, {"error": str(error)}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read one request and return its method, path, lower case headers and body, or None if the
+        connection was closed before a new request started."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as error:
+            if error.partial.strip():
+                raise HTTPError(400, "Incomplete request")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "Request headers are too large")
+
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, version = request_line.split(" ")
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, separator, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Malformed Content-Length")
+        if length < 0:
+            raise HTTPError(400, "Malformed Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    async def _route(self, method: str, path: str, body: bytes) -> dict:
+        """Handle a request and return the JSON response, or raise HTTPError."""
+        path = path.split("?", 1)[0]
+        # Unknown paths share one count, so clients can not grow the counts without limit.
+        counted = path if path in SERVER_ENDPOINTS else "other"
+        self._requests[counted] = self._requests.get(counted, 0) + 1
+        if path == "/stats":
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            return self.stats()
+        if path not in SERVER_ENDPOINTS:
+            raise HTTPError(404, f"No endpoint {path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST")
+
+        try:
+            request = json.loads(body)
+        except (UnicodeDecodeError, ValueError):
+            raise HTTPError(400, "Body is not valid JSON")
+        if path == "/evaluate":
+            expression = request.get("expression") if isinstance(request, dict) else None
+            if not isinstance(expression, str):
+                raise HTTPError(400, "Expected {\"expression\": string}")
+            return {"result": (await self._evaluate_limited([expression.strip()]))[0]}
+
+        expressions = request.get("expressions") if isinstance(request, dict) else None
+        if not isinstance(expressions, list) or not all(isinstance(expression, str) for expression in expressions):
+            raise HTTPError(400, "Expected {\"expressions\": [string, ...]}")
+        if len(expressions) > MAX_BATCH_EXPRESSIONS:
+            raise HTTPError(413, f"Batches are limited to {MAX_BATCH_EXPRESSIONS} expressions")
+        return {"results": await self._evaluate_limited([expression.strip() for expression in expressions])}
+
+    async def _evaluate_limited(self, expressions: list) -> list:
+        """Evaluate expressions once one of the max_concurrent slots is free, refusing the request if
+        max_queued requests are already waiting for one."""
+        if self._in_flight >= self.max_concurrent and self._waiting >= self.max_queued:
+            self._rejected += 1
+            raise HTTPError(503, "Server is busy, try again later")
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            return await self.evaluate(expressions)
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def _write_response(self, writer: asyncio.StreamWriter, status: int, response: dict, keep_alive: bool) -> None:
+        """Write a JSON response."""
+        body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, BLANK)}", "Content-Type: application/json; charset=utf-8",
+                f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
@@ -4,17 +4,38 @@ __author__ = "Mitchell Clark"
 
 import tkinter as tk
 from CalculatorModel import *
+from CalculatorHistory import CalculationHistory
+from CalculatorIncremental import IncrementalEvaluator
+from CalculatorWorker import CalculationWorker
+import queue
+import re
+import time
+
+# Digits as the lexer reads them and the operators that can be typed.
+_VALID_INPUT = re.compile(r"[\d" + re.escape(BLANK.join(ALLOWED_KEYBOARD_ENTERED_OPERATIONS)) + "]*")
+REPLAY_KEYS_PER_TICK = 32
 
 class CalculatorApp(tk.Frame):
     """The main calculator UI application which contains an input screen and
     and buttons."""
-    def __init__(self, master: tk.Tk, **kwargs) -> None:
-        """Initialises a new calculator app."""
+    def __init__(self, master: tk.Tk, evaluation_seconds: float = EVALUATION_TIME_LIMIT,
+                 evaluation_steps: int = EVALUATION_STEP_LIMIT, started: float = None,
+                 on_first_frame=None, replay: list = None, on_replay_finished=None, history_path: str = None,
+                 **kwargs) -> None:
+        """Initialises a new calculator app. Calculations taking longer than evaluation_seconds or more
+        than evaluation_steps instructions give MATH_ERROR. The time from started, a time.perf_counter
+        value defaulting to now, until the window is first drawn is passed to on_first_frame if given.
+        If replay is a list of keystrokes they are entered once the window is drawn, see replay_keys.
+        Calculations are kept in the history file at history_path, or in a temporary file if None."""
         super().__init__(master, **kwargs)
         self.pack()
         
         self._master = master
-        self._master.iconphoto(True, tk.PhotoImage(file="images/icon.png"))
+        self._started = time.perf_counter() if started is None else started
+        self._on_first_frame = on_first_frame
+        self.first_frame_seconds = None
+        self._replay = replay
+        self._on_replay_finished = on_replay_finished
 
         # Input display.
         self._entered_operations = tk.StringVar()
@@ -33,42 +54,109 @@ class CalculatorApp(tk.Frame):
         self._buttons_ui.pack()
 
         self._calculation_processor = CalculationProcessor()
-        self._last_answer = ""
+        self._live_evaluator = IncrementalEvaluator(self._calculation_processor, PREVIEW_MAX_BITS,
+                                                    PREVIEW_FACTORIAL_LIMIT)
+        self._worker = CalculationWorker(self._calculation_processor, evaluation_seconds, evaluation_steps)
+        self._pending_job = None
+        self._pending_expression = BLANK
+        self._polling = False
+        self._history = CalculationHistory(history_path)
+        self._history_entry = None
+        self._history_query = BLANK
+        self._show_fraction = None
+        self._pending_input = []
+        self._preview_scheduled = False
+        self._entered_operations.trace_add("write", self._schedule_preview)
         
         self._master.bind('<Return>', self.request_calculation)
+        self._first_expose = self._input_screen.bind("<Expose>", self._first_paint, add="+")
         self._master.mainloop()
-        
+        self._history.close()
+
+    def _first_paint(self, event: tk.Event) -> None:
+        """Waits for the window's first redraw to finish once it is exposed."""
+        self._input_screen.unbind("<Expose>", self._first_expose)
+        self.after_idle(self._finish_start_up)
+
+    def _finish_start_up(self) -> None:
+        """Records the time to the first frame, then loads the window icon, which is not needed to show it."""
+        self.first_frame_seconds = time.perf_counter() - self._started
+        if self._on_first_frame is not None:
+            self._on_first_frame(self.first_frame_seconds)
+        self._master.iconphoto(True, tk.PhotoImage(file=ICON_PATH))
+        if self._replay is not None:
+            self.replay_keys(self._replay, self._on_replay_finished)
+
     def _is_valid(self, possible_string: str) -> bool:
         """Tests a given string and returns true if it contains only allowed
         characters and false otherwise."""
-        valid = True
-        for character in possible_string:
-            character_valid = True
-            if character.isdigit():
-                continue
-            elif character in ALLOWED_KEYBOARD_ENTERED_OPERATIONS:
-                continue
-            else:
-                valid = False
-                break
-
-        return valid
+        return _VALID_INPUT.fullmatch(possible_string) is not None
 
     def add_to_display(self, input_to_add: str) -> None:
-        """Adds given input to the input screen."""
-        current_input = self._entered_operations.get()
-        current_input += input_to_add
+        """Adds given input to the input screen. Input added before the next frame is drawn is shown
+        with a single update."""
+        if not self._pending_input:
+            self.after_idle(self._flush_input)
+        self._pending_input.append(input_to_add)
+
+    def _flush_input(self) -> None:
+        """Shows input added since the last update and moves the cursor to the end."""
+        if not self._pending_input:
+            return
+        current_input = self._entered_operations.get() + BLANK.join(self._pending_input)
+        self._pending_input.clear()
         self._entered_operations.set(current_input)
         self._input_screen.icursor(len(current_input))
-        
+
+    def _schedule_preview(self, *args) -> None:
+        """Updates the preview once the current burst of edits has been handled."""
+        if not self._preview_scheduled:
+            self._preview_scheduled = True
+            self.after_idle(self._update_preview)
+
+    def replay_keys(self, keys: list, on_finished=None) -> None:
+        """Enter a recorded list of keystrokes, up to REPLAY_KEYS_PER_TICK at a time between frames. A
+        keystroke naming a button presses it and any other text is typed into the input screen. A key that
+        starts a calculation waits for its result, as it would have while the keys were recorded. Once
+        every key has been entered, on_finished is called with the number of keys, the seconds taken and
+        the output display."""
+        start = time.perf_counter()
+        press = self._buttons_ui.press
+
+        def enter(position: int) -> None:
+            end = min(position + REPLAY_KEYS_PER_TICK, len(keys))
+            while position < end:
+                key = keys[position]
+                position += 1
+                if not press(key):
+                    self._flush_input()
+                    self._input_screen.insert(tk.INSERT, key)
+                if self._pending_job is not None:
+                    break
+            self.after_idle(wait, position)
+
+        def wait(position: int) -> None:
+            if self._pending_job is not None or self._preview_scheduled:
+                self.after(RESULT_POLL_MILLISECONDS, wait, position)
+            elif position < len(keys):
+                enter(position)
+            elif on_finished is not None:
+                on_finished(len(keys), time.perf_counter() - start, self._output_message.get())
+
+        enter(0)
 
     def all_clear(self) -> None:
-        """Clear the input display."""
+        """Clear the input display and cancel any calculation in progress."""
+        self._cancel_calculation()
+        self._pending_input.clear()
         self._entered_operations.set("")
         self._output_message.set("")
 
     def delete(self) -> None:
-        """Deletes the character behind the cursor location or deletes the last character if cursor is not on input display."""
+        """Deletes the character behind the cursor location or deletes the last character if cursor is not on input display.
+        Any calculation in progress is cancelled."""
+        self._cancel_calculation()
+        self._flush_input()
         cursor_position = self._input_screen.index(tk.INSERT)
         current_input = self._entered_operations.get()
         if cursor_position == 0:
@@ -80,214 +168,178 @@ class CalculatorApp(tk.Frame):
         self._entered_operations.set(current_input)    
     
     def request_calculation(self, event: tk.Event = None) -> None:
-        """Sends current input screen to the CalculationProcessor."""
+        """Sends current input screen to be calculated in the background, replacing any calculation in progress."""
+        self._flush_input()
+        entered_operations = self._entered_operations.get()
+        self._start_calculation(self._worker.submit(entered_operations), entered_operations)
+
+    def _update_preview(self, *args) -> None:
+        """Shows the result of the input screen as it is typed. Only the part of the input after the
+        change is re-evaluated."""
+        self._preview_scheduled = False
         entered_operations = self._entered_operations.get()
-        final_evaluation = self._calculation_processor.process_input(entered_operations)
-        self._output_message.set(final_evaluation)
+        entry = self._history_entry
+        if entry is not None and entered_operations == entry.expression:
+            # A recalled calculation shows the result it had, which may have depended on an earlier Ans.
+            preview = entry.result
+        else:
+            preview = self._live_evaluator.preview(entered_operations)
+        self._output_message.set(preview)
+
+    def history_back(self) -> None:
+        """Recalls the calculation before the one shown. If the input has been edited since one was
+        recalled, recalls the latest calculation starting with the input instead."""
+        self._flush_input()
+        entered_operations = self._entered_operations.get()
+        entry = self._history_entry
+        if entry is None or entered_operations != entry.expression:
+            self._history_query = entered_operations
+            entry = self._history.search_back(entered_operations)
+        else:
+            entry = self._history.search_back(self._history_query, entry.index)
+        if entry is not None:
+            self._show_history(entry)
+
+    def history_forward(self) -> None:
+        """Recalls the calculation after the one shown, or restores the input the recall started from
+        after the latest one."""
+        self._flush_input()
+        entry = self._history_entry
+        if entry is None or self._entered_operations.get() != entry.expression:
+            return
+        entry = self._history.search_forward(self._history_query, entry.index)
+        if entry is None:
+            self._history_entry = None
+            self._set_input(self._history_query)
+        else:
+            self._show_history(entry)
+
+    def _show_history(self, entry) -> None:
+        """Shows a calculation from the history, cancelling any calculation in progress."""
+        self._cancel_calculation()
+        self._history_entry = entry
+        self._set_input(entry.expression)
+
+    def _set_input(self, text: str) -> None:
+        """Replaces the input screen with text and moves the cursor to the end."""
+        self._entered_operations.set(text)
+        self._input_screen.icursor(len(text))
+
+    def memory_add(self) -> None:
+        """Calculates the current input screen in the background and adds the result to the M memory register."""
+        self._flush_input()
+        entered_operations = self._entered_operations.get()
+        self._start_calculation(self._worker.submit(entered_operations, add_to_memory=True), entered_operations)
+
+    def switch_display(self) -> None:
+        """Switches the last result between standard (fraction) and decimal display without recalculating it."""
+        if self._pending_job is not None:
+            return
+        if self._show_fraction is None:
+            self._show_fraction = self._calculation_processor.number_mode == FRACTION_MODE
+        self._show_fraction = not self._show_fraction
+        self._output_message.set(self._calculation_processor.format_answer(self._show_fraction))
+
+    def switch_number_mode(self) -> None:
+        """Switches between float arithmetic and exact fraction arithmetic. Any calculation in progress is
+        cancelled."""
+        self._cancel_calculation()
+        if self._calculation_processor.number_mode == FRACTION_MODE:
+            self._calculation_processor.number_mode = FLOAT_MODE
+        else:
+            self._calculation_processor.number_mode = FRACTION_MODE
+        self._update_preview()
+
+    def _start_calculation(self, job_id: int, expression: str) -> None:
+        """Waits for the result of a submitted calculation without blocking the main loop."""
+        self._pending_job = job_id
+        self._pending_expression = expression
+        if not self._polling:
+            self._polling = True
+            self.after(RESULT_POLL_MILLISECONDS, self._poll_calculation)
+
+    def _cancel_calculation(self) -> None:
+        """Cancels the calculation in progress, if any."""
+        self._worker.cancel()
+        self._pending_job = None
+
+    def _poll_calculation(self) -> None:
+        """Shows the result of the pending calculation if it has finished, otherwise checks again later."""
+        if self._pending_job is None:
+            self._polling = False
+            return
+        try:
+            while True:
+                job_id, final_evaluation = self._worker.results.get_nowait()
+                if job_id == self._pending_job:
+                    self._pending_job = None
+                    self._polling = False
+                    self._show_fraction = None
+                    self._output_message.set(final_evaluation)
+                    if self._pending_expression:
+                        self._history.append(self._pending_expression, final_evaluation)
+                        self._history_entry = None
+                    return
+        except queue.Empty:
+            self.after(RESULT_POLL_MILLISECONDS, self._poll_calculation)
         
 
     
 class ButtonsUI(tk.Frame):
-    """Interface for all buttons on the calculator."""
+    """Interface for all buttons on the calculator, laid out from BUTTON_LAYOUT."""
     def __init__(self, master: tk.Tk, **kwargs) -> None:
-        """Initialises new ButtonsUI."""
+        """Initialises new ButtonsUI. The buttons are placed on a single grid in which each button spans
+        two half width columns, so rows of different lengths stay centred, with the arrows in the outer
+        columns. Every button calls the same Tcl command with its index, so pressing one does not need a
+        Python closure per button."""
         super().__init__(master, bg="grey")
+        self._actions = []
+        self._indexes = {}
+        self._buttons = {}
+        self._press_command = self.register(self._press)
 
-        # First row.
-        self._row_one = tk.Frame(self)
-        self._row_one.pack()
-
-        self._abs_button = tk.Button(self._row_one, text=ABSOLUTE_VALUE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._abs_button.pack(side=tk.LEFT)
-        self._cubed_button = tk.Button(self._row_one, text=X_CUBED, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._cubed_button.pack(side=tk.LEFT)
-        self._inverse_button = tk.Button(self._row_one, text=X_INVERSE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._inverse_button.pack(side=tk.LEFT)
-        self._factorial_button = tk.Button(self._row_one, text=X_FACTORIAL, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._factorial_button.pack(side=tk.LEFT)
-
-        # Second row.
-        self._row_two = tk.Frame(self)
-        self._row_two.pack()
-
-        self._fraction_button = tk.Button(self._row_two, text=FRACTION, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._fraction_button.pack(side=tk.LEFT)
-        self._square_root_button = tk.Button(self._row_two, text=X_ROOTED, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._square_root_button.pack(side=tk.LEFT)
-        self._squared_button = tk.Button(self._row_two, text=X_SQUARED, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._squared_button.pack(side=tk.LEFT)
-        self._powered_button = tk.Button(self._row_two, text=X_POWERED, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._powered_button.pack(side=tk.LEFT)
-        self._log_button = tk.Button(self._row_two, text=LOG, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._log_button.pack(side=tk.LEFT)
-        self._ln_button = tk.Button(self._row_two, text=LN, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._ln_button.pack(side=tk.LEFT)
-
-        # Third row.
-        self._row_three = tk.Frame(self)
-        self._row_three.pack()
-
-        self._negative_sign_button = tk.Button(self._row_three, text=NEGATIVE_SIGN, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._negative_sign_button.pack(side=tk.LEFT)
-        self._timecalc_button = tk.Button(self._row_three, text=TIME_CALCULATIONS, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._timecalc_button.pack(side=tk.LEFT)
-        self._hyperbolic_button = tk.Button(self._row_three, text=HYPERBOLIC, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._hyperbolic_button.pack(side=tk.LEFT)
-        self._sin_button = tk.Button(self._row_three, text=SIN, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._sin_button.pack(side=tk.LEFT)
-
-        self._cos_button = tk.Button(self._row_three, text=COS, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._cos_button.pack(side=tk.LEFT)
-        self._tan_button = tk.Button(self._row_three, text=TAN, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._tan_button.pack(side=tk.LEFT)
-
-        # Fourth row.
-        self._row_four = tk.Frame(self)
-        self._row_four.pack()
-
-        self._RCL_button = tk.Button(self._row_four, text=RCL, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._RCL_button.pack(side=tk.LEFT)
-        self._ENG_button = tk.Button(self._row_four, text=ENG, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._ENG_button.pack(side=tk.LEFT)
-        self._left_bracket_button = tk.Button(self._row_four, text=LEFT_BRACKET, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1\
-                                     , command=lambda: master.add_to_display(LEFT_BRACKET))
-        self._left_bracket_button.pack(side=tk.LEFT)
-        self._right_bracket_button = tk.Button(self._row_four, text=RIGHT_BRACKET, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1\
-                                     , command=lambda: master.add_to_display(RIGHT_BRACKET))
-        self._right_bracket_button.pack(side=tk.LEFT)
-        self._standard_and_decimal_button = tk.Button(self._row_four, text=STANDARD_AND_DECIMAL, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._standard_and_decimal_button.pack(side=tk.LEFT)
-        self._mplus_button = tk.Button(self._row_four, text=M_PLUS, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._mplus_button.pack(side=tk.LEFT)
-
-        # Fifth row (arrows here).
-        self._left_arrow = tk.Button(self, text="<<<", fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._left_arrow.pack(side=tk.LEFT, fill=tk.Y)
-        self._right_arrow = tk.Button(self, text=">>>", fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR1)
-        self._right_arrow.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self._row_five = tk.Frame(self)
-        self._row_five.pack()
-
-        self._seven_button = tk.Button(self._row_five, text=SEVEN, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(SEVEN))
-        self._seven_button.pack(side=tk.LEFT)
-        self._eight_button = tk.Button(self._row_five, text=EIGHT, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(EIGHT))
-        self._eight_button.pack(side=tk.LEFT)
-        self._nine_button = tk.Button(self._row_five, text=NINE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2
-                                     , command=lambda: master.add_to_display(NINE))
-        self._nine_button.pack(side=tk.LEFT)
-        self._delete_button = tk.Button(self._row_five, text=DELETE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR2, bg=BUTTON_COLOUR3\
-                                     , command=master.delete)
-        self._delete_button.pack(side=tk.LEFT)
-        self._all_clear_button = tk.Button(self._row_five, text=ALL_CLEAR, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR2, bg=BUTTON_COLOUR3\
-                                     , command=master.all_clear)
-        self._all_clear_button.pack(side=tk.LEFT)
+        half_columns = 2 * max(len(row) for row in BUTTON_LAYOUT)
+        self.grid_columnconfigure(tuple(range(1, half_columns + 1)), uniform="half")
+        for row_number, row in enumerate(BUTTON_LAYOUT):
+            first_column = 1 + half_columns // 2 - len(row)
+            for index, button in enumerate(row):
+                self._add_button(button).grid(row=row_number, column=first_column + 2 * index, columnspan=2,
+                                              sticky=tk.NSEW)
 
-        
+        arrow_rows = len(BUTTON_LAYOUT) - ARROWS_FIRST_ROW
+        for column, arrow in zip((0, half_columns + 1), ARROW_BUTTONS):
+            self._add_button(arrow, width=0).grid(row=ARROWS_FIRST_ROW, column=column, rowspan=arrow_rows,
+                                                  sticky=tk.NS)
+
+    def _add_button(self, button: tuple, width: int = BUTTON_WIDTH) -> tk.Button:
+        """Create a button from a BUTTON_LAYOUT entry. A width of 0 fits the button to its text."""
+        text, (text_colour, colour), method_name, argument = button
+        options = {}
+        if method_name is not None:
+            options["command"] = (self._press_command, len(self._actions))
+            self._indexes[text] = len(self._actions)
+            self._actions.append((getattr(self.master, method_name), argument))
+        widget = tk.Button(self, text=text, width=width, fg=text_colour, bg=colour, **options)
+        self._buttons[text] = widget
+        return widget
+
+    def press(self, text: str) -> bool:
+        """Press the button labelled text, returning False if there is no such button. Buttons without an
+        action do nothing."""
+        if text not in self._buttons:
+            return False
+        index = self._indexes.get(text)
+        if index is not None:
+            self._press(index)
+        return True
+
+    def _press(self, index) -> None:
+        """Handles a press of the button whose action is at index, which Tk passes as a string."""
+        method, argument = self._actions[int(index)]
+        if argument is None:
+            method()
+        else:
+            method(argument)
 
-        # Sixth row.
-        self._row_six = tk.Frame(self)
-        self._row_six.pack()
-
-        self._four_button = tk.Button(self._row_six, text=FOUR, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(FOUR))
-        self._four_button.pack(side=tk.LEFT)
-        self._five_button = tk.Button(self._row_six, text=FIVE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(FIVE))
-        self._five_button.pack(side=tk.LEFT)
-        self._six_button = tk.Button(self._row_six, text=SIX, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(SIX))
-        self._six_button.pack(side=tk.LEFT)
-        self._multiply_button = tk.Button(self._row_six, text=MULTIPLY, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(MULTIPLY))
-        self._multiply_button.pack(side=tk.LEFT)
-        self._divide_button = tk.Button(self._row_six, text=DIVIDE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(DIVIDE))
-        self._divide_button.pack(side=tk.LEFT)
-
-        # Seventh row.
-        self._row_seven = tk.Frame(self)
-        self._row_seven.pack()
-
-        self._one_button = tk.Button(self._row_seven, text=ONE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(ONE))
-        self._one_button.pack(side=tk.LEFT)
-        self._two_button = tk.Button(self._row_seven, text=TWO, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(TWO))
-        self._two_button.pack(side=tk.LEFT)
-        self._three_button = tk.Button(self._row_seven, text=THREE, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(THREE))
-        self._three_button.pack(side=tk.LEFT)
-        self._plus_button = tk.Button(self._row_seven, text=PLUS, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(PLUS))
-        self._plus_button.pack(side=tk.LEFT)
-        self._minus_button = tk.Button(self._row_seven, text=MINUS, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(MINUS))
-        self._minus_button.pack(side=tk.LEFT)
-
-        # Eighth row.
-        self._row_eight = tk.Frame(self)
-        self._row_eight.pack()
-
-        self._zero_button = tk.Button(self._row_eight, text=ZERO, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(ZERO))
-        self._zero_button.pack(side=tk.LEFT)
-        self._dot_button = tk.Button(self._row_eight, text=DOT, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(DOT))
-        self._dot_button.pack(side=tk.LEFT)
-        self._scientific_notation_button = tk.Button(self._row_eight, text=SCIENTIFIC_NOTATION, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2)
-        self._scientific_notation_button.pack(side=tk.LEFT)
-        self._answer_button = tk.Button(self._row_eight, text=ANSWER, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=lambda: master.add_to_display(ANSWER))
-        self._answer_button.pack(side=tk.LEFT)
-        self._equals_button = tk.Button(self._row_eight, text=EQUALS, \
-                                     width=BUTTON_WIDTH, fg=BUTTON_TEXT_COLOUR1, bg=BUTTON_COLOUR2\
-                                     , command=master.request_calculation)
-        self._equals_button.pack(side=tk.LEFT)
-        
-        
 if __name__ == "__main__":
     print(NOT_STANDALONE)
@@ -0,0 +1,71 @@
+"""Background evaluation for ScientificCalculator.py"""
+
+__author__ = "Mitchell Clark"
+
+from Constants import *
+from CalculatorModel import CalculationProcessor, EvaluationBudget, EvaluationCancelled
+import queue
+import threading
+
+class CalculationWorker:
+    """Evaluates expressions one at a time on a background thread. Submitting a new expression cancels
+    the one in progress. Results are put on the results queue as (job id, result to display) so a GUI can
+    collect them from its own thread."""
+    def __init__(self, processor: CalculationProcessor, seconds: float = EVALUATION_TIME_LIMIT,
+                 steps: int = EVALUATION_STEP_LIMIT) -> None:
+        """Initialises and starts a worker. Each evaluation may run for at most seconds and steps
+        instructions before it gives MATH_ERROR."""
+        self.results = queue.Queue()
+        self._processor = processor
+        self._seconds = seconds
+        self._steps = steps
+        self._jobs = queue.Queue()
+        self._budget = None
+        self._last_job_id = 0
+        self._thread = threading.Thread(target=self._run, name="CalculationWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, expression: str, add_to_memory: bool = False) -> int:
+        """Cancel the evaluation in progress and queue expression, returning its job id. If add_to_memory
+        is True the result is also added to the M memory register."""
+        self.cancel()
+        self._last_job_id += 1
+        self._budget = EvaluationBudget(self._seconds, self._steps)
+        self._jobs.put((self._last_job_id, expression, add_to_memory, self._budget))
+        return self._last_job_id
+
+    def cancel(self) -> None:
+        """Cancel the evaluation in progress, if any. It will not put a result on the results queue."""
+        if self._budget is not None:
+            self._budget.cancel()
+            self._budget = None
+
+    def close(self) -> None:
+        """Cancel any evaluation and stop the worker thread."""
+        self.cancel()
+        self._jobs.put(None)
+
+    def _run(self) -> None:
+        """Evaluate queued jobs until closed. A job raising an unexpected exception gives MATH_ERROR."""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            job_id, expression, add_to_memory, budget = job
+            if budget.cancelled:
+                continue
+            try:
+                if add_to_memory:
+                    result = self._processor.memory_add(expression, budget)
+                else:
+                    result = self._processor.process_input(expression, budget=budget)
+            except EvaluationCancelled:
+                continue
+            except Exception:
+                # Anything unexpected must not stop the worker, or later jobs would never get a result.
+                result = MATH_ERROR
+            if not budget.cancelled:
+                self.results.put((job_id, result))
+
+if __name__ == "__main__":
+    print(NOT_STANDALONE)
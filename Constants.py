@@ -69,14 +69,132 @@ SCIENTIFIC_NOTATION = "×10^x"
 ANSWER = "Ans"
 EQUALS = "="
 
+# Expression symbols that do not have their own button.
+POWER = "^"
+SQUARE_ROOT = "√"
+FACTORIAL = "!"
+ABSOLUTE_BAR = "|"
+KEYBOARD_DIVIDE = "/"
+
+MEMORY = "M"
+
+# Arrows beside the keypad.
+HISTORY_BACK = "<<<"
+HISTORY_FORWARD = ">>>"
+
+ICON_PATH = "images/icon.png"
+
+# Button layout. Each button is (text, (text colour, background colour), CalculatorApp method called when
+# it is pressed or None, argument passed to the method or None).
+FUNCTION_KEY = (BUTTON_TEXT_COLOUR1, BUTTON_COLOUR1)
+KEYPAD_KEY = (BUTTON_TEXT_COLOUR1, BUTTON_COLOUR2)
+CONTROL_KEY = (BUTTON_TEXT_COLOUR2, BUTTON_COLOUR3)
+ADD_TO_DISPLAY = "add_to_display"
+BUTTON_LAYOUT = (
+    ((ABSOLUTE_VALUE, FUNCTION_KEY, None, None), (X_CUBED, FUNCTION_KEY, None, None),
+     (X_INVERSE, FUNCTION_KEY, None, None), (X_FACTORIAL, FUNCTION_KEY, None, None)),
+    ((FRACTION, FUNCTION_KEY, "switch_number_mode", None), (X_ROOTED, FUNCTION_KEY, None, None),
+     (X_SQUARED, FUNCTION_KEY, None, None), (X_POWERED, FUNCTION_KEY, None, None),
+     (LOG, FUNCTION_KEY, None, None), (LN, FUNCTION_KEY, None, None)),
+    ((NEGATIVE_SIGN, FUNCTION_KEY, None, None), (TIME_CALCULATIONS, FUNCTION_KEY, None, None),
+     (HYPERBOLIC, FUNCTION_KEY, None, None), (SIN, FUNCTION_KEY, None, None),
+     (COS, FUNCTION_KEY, None, None), (TAN, FUNCTION_KEY, None, None)),
+    ((RCL, FUNCTION_KEY, ADD_TO_DISPLAY, MEMORY), (ENG, FUNCTION_KEY, None, None),
+     (LEFT_BRACKET, FUNCTION_KEY, ADD_TO_DISPLAY, LEFT_BRACKET),
+     (RIGHT_BRACKET, FUNCTION_KEY, ADD_TO_DISPLAY, RIGHT_BRACKET),
+     (STANDARD_AND_DECIMAL, FUNCTION_KEY, "switch_display", None), (M_PLUS, FUNCTION_KEY, "memory_add", None)),
+    ((SEVEN, KEYPAD_KEY, ADD_TO_DISPLAY, SEVEN), (EIGHT, KEYPAD_KEY, ADD_TO_DISPLAY, EIGHT),
+     (NINE, KEYPAD_KEY, ADD_TO_DISPLAY, NINE), (DELETE, CONTROL_KEY, "delete", None),
+     (ALL_CLEAR, CONTROL_KEY, "all_clear", None)),
+    ((FOUR, KEYPAD_KEY, ADD_TO_DISPLAY, FOUR), (FIVE, KEYPAD_KEY, ADD_TO_DISPLAY, FIVE),
+     (SIX, KEYPAD_KEY, ADD_TO_DISPLAY, SIX), (MULTIPLY, KEYPAD_KEY, ADD_TO_DISPLAY, MULTIPLY),
+     (DIVIDE, KEYPAD_KEY, ADD_TO_DISPLAY, DIVIDE)),
+    ((ONE, KEYPAD_KEY, ADD_TO_DISPLAY, ONE), (TWO, KEYPAD_KEY, ADD_TO_DISPLAY, TWO),
+     (THREE, KEYPAD_KEY, ADD_TO_DISPLAY, THREE), (PLUS, KEYPAD_KEY, ADD_TO_DISPLAY, PLUS),
+     (MINUS, KEYPAD_KEY, ADD_TO_DISPLAY, MINUS)),
+    ((ZERO, KEYPAD_KEY, ADD_TO_DISPLAY, ZERO), (DOT, KEYPAD_KEY, ADD_TO_DISPLAY, DOT),
+     (SCIENTIFIC_NOTATION, KEYPAD_KEY, None, None), (ANSWER, KEYPAD_KEY, ADD_TO_DISPLAY, ANSWER),
+     (EQUALS, KEYPAD_KEY, "request_calculation", None)),
+)
+# The arrows run down either side of the rows from this one on.
+ARROWS_FIRST_ROW = 4
+ARROW_BUTTONS = ((HISTORY_BACK, FUNCTION_KEY, "history_back", None),
+                 (HISTORY_FORWARD, FUNCTION_KEY, "history_forward", None))
+
 BRACKETS = (LEFT_BRACKET, RIGHT_BRACKET)
 ALLOWED_KEYBOARD_ENTERED_OPERATIONS = ('+', '-', '×', '/', '!', '(', ')', '.')
 OPERATIONS = ('+', '-', '×', '/', '!', '(', ')')
 ADVANCED_OPERATIONS = ('^', '√', '!', '|', 'log', 'ln', 'sin', 'cos', 'tan')
 NUMBER_PARTS = ('1', '2', '3', '4', '5', '6', '7', '8', '9', '0', '.')
+FUNCTIONS = (ABSOLUTE_VALUE, LOG, LN, SIN, COS, TAN)
 MATH_ERROR = "Math ERROR"
 SYNTAX_ERROR = "Syntax ERROR"
 
+# Expression parsing.
+NUMBER_TOKEN = "number"
+NAME_TOKEN = "name"
+SYMBOL_TOKEN = "symbol"
+END_TOKEN = "end"
+
+# Binding powers used by the parser, from loosest to tightest.
+SUM_PRECEDENCE = 10
+PRODUCT_PRECEDENCE = 20
+NEGATION_PRECEDENCE = 30
+FUNCTION_PRECEDENCE = 40
+POWER_PRECEDENCE = 50
+FACTORIAL_PRECEDENCE = 60
+BINARY_PRECEDENCES = {PLUS: SUM_PRECEDENCE, MINUS: SUM_PRECEDENCE, MULTIPLY: PRODUCT_PRECEDENCE,
+                      DIVIDE: PRODUCT_PRECEDENCE, POWER: POWER_PRECEDENCE}
+RIGHT_ASSOCIATIVE = (POWER,)
+
+# Instructions of a compiled expression.
+PUSH_NUMBER = 0
+LOAD_VARIABLE = 1
+APPLY_UNARY = 2
+APPLY_BINARY = 3
+STORE_TEMPORARY = 4
+LOAD_TEMPORARY = 5
+
+# Number display.
+DISPLAY_DIGITS = 10
+EXPONENT_SEPARATOR = "×10^"
+MAX_EXACT_POWER_BITS = 4096
+FLOAT_FACTORIAL_LIMIT = 170
+EXACT_FACTORIAL_LIMIT = 100000
+EXACT_DISPLAY_BITS = 332
+TRIGONOMETRY_DIGITS = 15
+
+# Evaluation off the main loop.
+EVALUATION_TIME_LIMIT = 2.0
+EVALUATION_STEP_LIMIT = 1000000
+# The live preview runs on the GUI thread, so it skips ints and factorials larger than these.
+PREVIEW_MAX_BITS = 1 << 16
+PREVIEW_FACTORIAL_LIMIT = 5000
+RESULT_POLL_MILLISECONDS = 20
+
+DEGREES = "Deg"
+RADIANS = "Rad"
+
+# Number modes.
+FLOAT_MODE = "float"
+DECIMAL_MODE = "decimal"
+FRACTION_MODE = "fraction"
+NUMBER_MODES = (FLOAT_MODE, DECIMAL_MODE, FRACTION_MODE)
+DECIMAL_PRECISION = 28
+# Lines of a batch sent to a worker at a time.
+DEFAULT_CHUNK_SIZE = 4096
+
+# Profiled stages and measures.
+TOKENIZE_STAGE = "tokenize"
+PARSE_STAGE = "parse"
+COMPILE_STAGE = "compile"
+EVALUATE_STAGE = "evaluate"
+FORMAT_STAGE = "format"
+PROCESS_INPUT_STAGE = "process_input"
+NESTING_DEPTH = "nesting depth"
+PROGRAM_LENGTH = "instructions"
+ELIMINATED_NODES = "eliminated nodes"
+
 BLANK = ""
 
 if __name__ == "__main__":
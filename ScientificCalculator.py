@@ -1,12 +1,158 @@
 """Scientific calculator application based on the CASIO fx-82AU PLUS II."""
 
-from CalculatorView import *
+from Constants import *
+import argparse
+import sys
+import time
+
+def parse_arguments(arguments: list = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=APP_TITLE)
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="evaluate one expression per line of FILE (or stdin) without the GUI")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="serve evaluations as JSON over HTTP on PORT without the GUI")
+    parser.add_argument("--host", default="127.0.0.1", help="address the --serve server listens on")
+    parser.add_argument("--cache-size", type=int, default=0, metavar="N",
+                        help="memoize up to N expressions and results in batch or server mode")
+    parser.add_argument("--persistent-cache", metavar="FILE",
+                        help="keep slow results in FILE between runs in batch mode")
+    parser.add_argument("--mode", choices=NUMBER_MODES, default=FLOAT_MODE,
+                        help="number representation used in batch mode")
+    parser.add_argument("--precision", type=int, default=DECIMAL_PRECISION, metavar="DIGITS",
+                        help="significant digits kept in decimal mode")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="evaluate the batch, or served requests, in parallel on N worker processes "
+                             "(0 for one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, metavar="N",
+                        help="number of lines sent to a worker at a time")
+    parser.add_argument("--threads", action="store_true", help="use worker threads instead of processes")
+    parser.add_argument("--stats", action="store_true", help="report throughput on stderr after a batch")
+    parser.add_argument("--profile", nargs="?", const="-", metavar="FILE",
+                        help="report the time spent in each evaluation stage on stderr after a sequential batch, "
+                             "and save cProfile stats to FILE if given. Without --batch or --serve, report the "
+                             "time until the window is first drawn")
+    parser.add_argument("--history", metavar="FILE",
+                        help="keep the calculation history in FILE between sessions instead of a temporary file")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="open the window, enter the keystrokes in FILE (one button label or typed text "
+                             "per line), print the result and report input throughput on stderr")
+    arguments = parser.parse_args(arguments)
+    if arguments.profile is not None and arguments.workers is not None:
+        parser.error("--profile can not be used with --workers")
+    return arguments
+
+def run_batch(path: str, arguments: argparse.Namespace) -> None:
+    """Stream expressions from path, or stdin if path is '-', and write results to stdout."""
+    if path == "-":
+        _run_batch_lines(sys.stdin, arguments)
+    else:
+        with open(path, encoding="utf-8") as lines:
+            _run_batch_lines(lines, arguments)
+
+def _run_batch_lines(lines, arguments: argparse.Namespace) -> None:
+    """Evaluate lines sequentially, or in parallel if a worker count was given."""
+    persistent_cache = None
+    if arguments.persistent_cache:
+        from CalculatorCache import PersistentResultCache
+        persistent_cache = PersistentResultCache(arguments.persistent_cache)
+
+    if arguments.workers is None:
+        from CalculatorBatch import evaluate_stream
+        from CalculatorModel import CalculationProcessor
+
+        start = time.perf_counter()
+        processor = CalculationProcessor(arguments.cache_size, persistent_cache=persistent_cache,
+                                         number_mode=arguments.mode, decimal_precision=arguments.precision)
+        if arguments.profile is None:
+            count = evaluate_stream(lines, sys.stdout, processor)
+        else:
+            count = _profile_batch(lines, processor, arguments.profile)
+        elapsed = time.perf_counter() - start
+        if arguments.stats:
+            print(f"{count} expressions in {elapsed:.3f}s ({count / elapsed:.0f}/s)", file=sys.stderr)
+            if persistent_cache is not None:
+                print(f"persistent cache: {persistent_cache.stats()}", file=sys.stderr)
+        return
+
+    from CalculatorBatch import ParallelBatchRunner
+    runner = ParallelBatchRunner(arguments.workers, arguments.chunk_size, arguments.threads,
+                                 arguments.cache_size, persistent_cache, arguments.mode, arguments.precision)
+    runner.run(lines, sys.stdout)
+    if arguments.stats:
+        stats = runner.stats()
+        print(f"{stats['expressions']} expressions in {stats['seconds']:.3f}s "
+              f"({stats['expressions_per_second']:.0f}/s)", file=sys.stderr)
+        for worker, worker_stats in sorted(stats["workers"].items()):
+            print(f"  worker {worker}: {worker_stats['expressions']} expressions "
+                  f"({worker_stats['expressions_per_second']:.0f}/s)", file=sys.stderr)
+
+def _profile_batch(lines, processor, path: str) -> int:
+    """Evaluate lines with stage profiling and print the summary to stderr. If path is not '-' the run is
+    also profiled with cProfile and its stats saved to path for pstats or other viewers."""
+    from CalculatorBatch import evaluate_stream
+    from CalculatorProfile import StageProfiler
+
+    processor.profiler = StageProfiler()
+    if path == "-":
+        count = evaluate_stream(lines, sys.stdout, processor)
+    else:
+        import cProfile
+        profile = cProfile.Profile()
+        count = profile.runcall(evaluate_stream, lines, sys.stdout, processor)
+        profile.dump_stats(path)
+    print(processor.profiler.summary(), file=sys.stderr)
+    return count
+
+def run_server(arguments: argparse.Namespace) -> None:
+    """Serve evaluations over HTTP until interrupted."""
+    import asyncio
+    from CalculatorServer import CalculatorServer, SERVER_CACHE_SIZE
+
+    server = CalculatorServer(arguments.workers, arguments.threads, arguments.cache_size or SERVER_CACHE_SIZE,
+                              chunk_size=arguments.chunk_size, number_mode=arguments.mode,
+                              decimal_precision=arguments.precision)
+    print(f"Serving on http://{arguments.host}:{arguments.serve}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever(arguments.host, arguments.serve))
+    except KeyboardInterrupt:
+        pass
+
+def run_gui(arguments: argparse.Namespace) -> None:
+    """Open the calculator window. With --profile the time until the window is first drawn is reported on
+    stderr. With --replay the window closes once the recorded keystrokes have been entered."""
+    started = time.perf_counter()
+    import tkinter as tk
+    from CalculatorView import CalculatorApp
+
+    keys = None
+    if arguments.replay is not None:
+        with open(arguments.replay, encoding="utf-8") as lines:
+            keys = [line.rstrip("\n") for line in lines if line.rstrip("\n")]
+
+    def report_first_frame(seconds: float) -> None:
+        print(f"first frame after {seconds * 1000:.1f}ms", file=sys.stderr)
+
+    def report_replay(count: int, seconds: float, result: str) -> None:
+        print(result)
+        print(f"{count} keystrokes in {seconds:.3f}s ({count / seconds:.0f}/s)", file=sys.stderr)
+        root.destroy()
 
-def main():
-    """Entry point to application."""
     root = tk.Tk()
     root.title(APP_TITLE)
-    calculator = CalculatorApp(root)
+    calculator = CalculatorApp(root, started=started,
+                               on_first_frame=report_first_frame if arguments.profile is not None else None,
+                               replay=keys, on_replay_finished=report_replay, history_path=arguments.history)
+
+def main():
+    """Entry point to application."""
+    arguments = parse_arguments()
+    if arguments.serve is not None:
+        run_server(arguments)
+    elif arguments.batch is not None:
+        run_batch(arguments.batch, arguments)
+    else:
+        run_gui(arguments)
 
 if __name__ == "__main__":
     main()